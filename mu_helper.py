@@ -10,114 +10,30 @@ utilities extending PyMuPDF
 """
 
 
-def span_font_info(s, granularity=True):
-
-    styles = {}
-    if granularity:
-        identifier = "{0}_{1}_{2}_{3}".format(round(s['size'], 0), s['flags'], s['font'],
-                                              s['color'])
-        styles[identifier] = {'size': round(s['size'], 0), 'flags': s['flags'], 'font': s['font'],
-                              'color': s['color'],
-                              'italic' : True if "italic" in str(s['font'].lower()) else False,
-                              'bold': True if "bold" in str(s['font'].lower()) else False,
-                              }
-        font_stats = {'size': s['size'], 'flags': s['flags'], 'font': s['font'],
-                              'color': s['color'],
-                              'italic' : True if "italic" in str(s['font'].lower()) else False,
-                              'bold': True if "bold" in str(s['font'].lower()) else False,
-                                }
-
-
-    else:
-        identifier = "{0}".format(round(s['size']))
-        styles[identifier] = {'size': round(s['size']), 'font': s['font']}
-    #TODO: Implement font_counts, font_stats
-
-    return {'font_counts': [],
-            'styles' :styles,
-            'font_stats': font_stats,
-            'bbox'      : s['bbox']
-            }
+# PyMuPDF span flag bits
+FLAG_ITALIC = 2
+FLAG_BOLD = 16
+# font sizes are compared as integers in 1/SIZE_QUANTUM pt
+SIZE_QUANTUM = 100
 
 
+def quantize_size(size) -> int:
+    """font size as integer in 1/SIZE_QUANTUM pt, used to compare sizes without float noise"""
+    return int(round(size * SIZE_QUANTUM))
 
 
-def doc_font_info(doc, granularity=True):
-    """Extracts fonts and their usage in PDF documents.
-    :param doc: fitz.doc to iterate through
-    :type doc: <class 'fitz.fitz.Document'>
-    :param granularity: also use 'font', 'flags' and 'color' to discriminate text
-    :type granularity: bool
-    :rtype: [(font_size, count), (font_size, count}], dict
-    :return: most used fonts sorted by count, font style information
-    """
-    styles = {}
-    font_counts = {}
-    sizes = []
-    colors = []
-    fonts = []
-    doc_bbox = []
-    for page in doc:
-        h, w = page.rect.height, page.rect.width
-        rect = fitz.Rect(0, 10, w, h - 20)
-        blocks = page.get_text("dict", sort=True, clip=rect)["blocks"]
-        for b in blocks:  # iterate through the text blocks
-            if b['type'] == 0:  # block contains text
-                for l in b["lines"]:  # iterate through the text lines
-                    for s in l["spans"]:  # iterate through the text spans
-                        if granularity:
-                            identifier = "{0}_{1}_{2}_{3}".format(round(s['size'], 0), s['flags'], s['font'],
-                                                                  s['color'])
-                            styles[identifier] = {'size': round(s['size'], 0), 'flags': s['flags'], 'font': s['font'],
-                                                  'color': s['color']}
-                            doc_bbox.append((s['bbox'], s['bbox'][2]-s['bbox'][0]))
-                        else:
-                            identifier = "{0}".format(round(s['size']))
-                            styles[identifier] = {'size': round(s['size']), 'font': s['font']}
-                            doc_bbox.append((s['bbox'], s['bbox'][2]-s['bbox'][0]))
-                        sizes.append(s['size'])
-                        colors.append(s['color'])
-                        fonts.append(s['font'])
-                        font_counts[identifier] = font_counts.get(identifier, 0) + 1  # count the fonts usage
-
-
-    size_counts = Counter(sizes)
-    common_size = size_counts.most_common(1)[0][0]
-    #
-    fonts_counts = Counter(fonts)
-    common_font = fonts_counts.most_common(1)[0][0]
-    #
-    color_counts = Counter(colors)
-    common_color = color_counts.most_common(1)[0][0]
-    
-    
-    sizes = list(set(sizes))
-    font_counts = sorted(font_counts.items(), key=itemgetter(1), reverse=True)
-    
+def is_bold(flags) -> bool:
+    return bool(flags & FLAG_BOLD)
 
-    if len(font_counts) < 1:
-        raise ValueError("Zero discriminating fonts found!")
-    for s, v in font_counts:
-        styles[s]['count'] = v
-        
-    maxx = 0
-    bbox = (0,0,0,0)
-    for box, value in doc_bbox:
-        if value > maxx:
-            maxx = value
-            bbox = box
 
+def is_italic(flags) -> bool:
+    return bool(flags & FLAG_ITALIC)
 
-    #TODO: add additional
-    font_stats = {
-        'max_font'     : max(sizes),
-        'min_font'     : min(sizes),
-        'common_color' : common_color,
-        'common_font'  : common_font,
-        'common_size'  : common_size,
-    }
 
-    return {'font_counts':font_counts, 'styles':styles, 'font_stats':font_stats, 'bbox': bbox, 'page_w':w, 'page_h':h}
+# top / bottom margin of a page that is excluded from the document statistics, spans count if their baseline lies
+# within, see pdfstructure.model.spantable.SpanTable.stats_spans
+STATS_CLIP_TOP = 10
+STATS_CLIP_BOTTOM = 20
 
 
 def block_font_info(block, granularity=True):
@@ -134,6 +50,7 @@ def block_font_info(block, granularity=True):
     sizes = []
     colors = []
     fonts = []
+    flags = []
     lines_info={}
     Widths = []
     if block['type'] == 0:  # block contains text
@@ -156,6 +73,7 @@ def block_font_info(block, granularity=True):
                 sizes.append(s['size'])
                 colors.append(s['color'])
                 fonts.append(s['font'])
+                flags.append(s['flags'])
                 font_counts[identifier] = font_counts.get(identifier, 0) + 1  # count the fonts usage
 
                 lines_info[i]['text']+=s['text']
@@ -181,8 +99,10 @@ def block_font_info(block, granularity=True):
     
 
 
-        bold = True if "bold" in str(common_font.lower()) else False
-        italic = True if "italic" in str(common_font.lower()) else False
+        # style bits of the first span set in the most common font
+        common_flags = flags[fonts.index(common_font)]
+        bold = is_bold(common_flags)
+        italic = is_italic(common_flags)
         
         #TODO: add additional
         font_stats = {
@@ -0,0 +1,66 @@
+"""
+sampling based estimation of the document style (common size, font and color).
+instead of scanning every page before the first heading can be classified, the statistics are taken
+from a stratified sample of pages. a confidence measure tells whether the sample is decisive,
+ambiguous samples fall back to a full scan.
+"""
+from typing import List
+import numpy as np
+from pdfstructure.model.spantable import SpanTable
+
+# pages sampled by default
+SAMPLE_PAGES = 8
+# below this confidence the estimate is treated as ambiguous
+MIN_CONFIDENCE = 0.2
+# samples with fewer spans (inside the statistics clip) are ambiguous
+MIN_SAMPLE_SPANS = 50
+
+
+def stratified_sample(page_numbers: List[int], sample_size: int) -> List[int]:
+    """
+    split the pages into @sample_size equally sized strata and pick the middle page of each.
+    @param page_numbers: sorted candidate pages
+    @return: sorted sample, all pages if there are not more than @sample_size
+    """
+    if len(page_numbers) <= sample_size:
+        return list(page_numbers)
+    step = len(page_numbers) / sample_size
+    return sorted({page_numbers[int(step * i + step / 2)] for i in range(sample_size)})
+
+
+def margin(values: np.ndarray) -> float:
+    """
+    lead of the most common value over the runner-up, relative to all values (1.0 if there is only one value)
+    """
+    _, counts = np.unique(values, return_counts=True)
+    if len(counts) < 2:
+        return 1.0
+    second, first = np.sort(counts)[-2:]
+    return float(first - second) / len(values)
+
+
+def style_confidence(table: SpanTable) -> float:
+    """
+    confidence that the common size, font and color of the sampled table are the ones of the whole document:
+    the smallest margin of the three most common values, 0 if the sample holds too few spans.
+    """
+    spans = table.stats_spans()
+    if len(spans) < MIN_SAMPLE_SPANS:
+        return 0.0
+    return min(margin(spans['size']), margin(spans['font']), margin(spans['color']))
+
+
+def estimate_font_info(table: SpanTable, sample: List[int], min_confidence=MIN_CONFIDENCE):
+    """
+    document style statistics of a sampled table (see SpanTable.font_info).
+    @param table: SpanTable of the sampled pages
+    @param sample: sampled page numbers
+    @return: (font_info, confidence), font_info has an 'estimate' entry {'pages', 'confidence', 'full_scan'}
+             and is None if the sample is ambiguous
+    """
+    confidence = style_confidence(table)
+    if confidence < min_confidence:
+        return None, confidence
+    font_info = table.font_info()
+    font_info['estimate'] = {'pages': sample, 'confidence': confidence, 'full_scan': False}
+    return font_info, confidence
@@ -0,0 +1,147 @@
+"""
+geometry of the spans as the header rules (see pdfstructure.hierarchy.header_rules) and the viewer compare it:
+whitespace left / right of a span vs its block (or vs its page if the span is as wide as its block), deviation of
+its center and its position relative to the page. same values as mu_helper.Whitespace, computed with numpy for all
+spans of a SpanTable (a page or the document) at once and cached on the table.
+"""
+from collections import namedtuple
+import numpy as np
+from pdfstructure.model.spantable import SpanTable
+
+# columns of TableGeometry and fields of SpanGeometry
+GEOMETRY_FIELDS = ('valid', 'one_span', 'whitespace_left', 'whitespace_right', 'whitespace_ratio',
+                   'center_deviation', 'page_x0', 'page_y0', 'page_x1', 'page_y1', 'page_center_deviation')
+
+
+def whitespace_geometry(span: np.ndarray, block: np.ndarray, page: np.ndarray, page_size: np.ndarray) -> dict:
+    """
+    @param span: span bboxes, shape (n, 4)
+    @param block: bboxes of the blocks of the spans, shape (n, 4)
+    @param page: bboxes of the pages of the spans, shape (n, 4)
+    @param page_size: (width, height) of the pages of the spans, shape (n, 2)
+    @return: {field of GEOMETRY_FIELDS: array of n values}, whitespace percentages are nan where
+             mu_helper.Whitespace has none (zero widths, span right of its block)
+    """
+    width_small = span[:, 2] - span[:, 0]
+    valid = width_small != 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        one_span = (block[:, 2] - block[:, 0]) / width_small > 0.99
+        # the box the span is compared to
+        large = np.where(one_span[:, None], page, block)
+        width_large = large[:, 2] - large[:, 0]
+        compare = valid & (width_large != 0)
+
+        whitespace_left = np.where(compare, np.round(np.abs(large[:, 0] - span[:, 0]) * 100 / width_large), np.nan)
+        whitespace_right = np.where(compare & (span[:, 2] <= large[:, 2]),
+                                    np.round(np.abs(large[:, 2] - span[:, 2]) * 100 / width_large), np.nan)
+        whitespace_ratio = np.where(compare, np.round(np.abs(width_small / width_large - 1) * 100), np.nan)
+
+        midpoint_small = (span[:, 2] + span[:, 0]) / 2
+        midpoint_large = (large[:, 2] + large[:, 0]) / 2
+        center_deviation = np.where(midpoint_large != 0, np.abs(midpoint_small / midpoint_large - 1) * 100, 0.)
+        midpoint_page = (page[:, 2] + page[:, 0]) / 2
+        page_center_deviation = np.where(midpoint_page != 0, np.abs(midpoint_small / midpoint_page - 1) * 100, 0.)
+
+        relative = span / np.tile(page_size, 2)
+
+    return {'valid': valid,
+            'one_span': valid & one_span,
+            'whitespace_left': whitespace_left,
+            'whitespace_right': whitespace_right,
+            'whitespace_ratio': whitespace_ratio,
+            'center_deviation': center_deviation,
+            'page_x0': relative[:, 0],
+            'page_y0': relative[:, 1],
+            'page_x1': relative[:, 2],
+            'page_y1': relative[:, 3],
+            'page_center_deviation': page_center_deviation}
+
+# columns the header rules read, spans with equal values are equal to the rules (see TableGeometry.rule_keys)
+RULE_GEOMETRY_FIELDS = ('valid', 'one_span', 'whitespace_left', 'whitespace_right', 'whitespace_ratio',
+                        'center_deviation')
+
+# geometry of one span with python values, see @TableGeometry for the fields
+SpanGeometry = namedtuple('SpanGeometry', GEOMETRY_FIELDS)
+
+
+class TableGeometry:
+    """
+    geometry of all spans of a SpanTable as arrays, one entry per span row:
+    valid: span has a width, all whitespace conditions are false for spans without
+    one_span: span is as wide as its block, it is compared to the page instead of the block
+    whitespace_left / whitespace_right: rounded percentage of whitespace left / right of the span vs block or page
+    whitespace_ratio: rounded percentage the span width differs from the block or page width
+    center_deviation: percentage the span midpoint deviates from the block or page midpoint (not rounded)
+    page_x0, page_y0, page_x1, page_y1: span bbox relative to the page size
+    page_center_deviation: percentage the span midpoint deviates from the page midpoint
+    """
+
+    def __init__(self, table: SpanTable):
+        spans = table.spans
+        counts = table.pages['span_stop'] - table.pages['span_start']
+        page = np.repeat(table.pages['bbox'], counts, axis=0)
+        page_size = np.repeat(np.stack([table.pages['width'], table.pages['height']], axis=1), counts, axis=0)
+        self.columns = whitespace_geometry(spans['bbox'], table.blocks['bbox'][spans['block']], page, page_size)
+        self._spans = None
+        self._rule_keys = None
+
+    def __getattr__(self, name):
+        columns = self.__dict__.get('columns')
+        if columns is None or name not in columns:
+            raise AttributeError(name)
+        return columns[name]
+
+    def __len__(self):
+        return len(self.columns['valid'])
+
+    def span(self, i) -> SpanGeometry:
+        """
+        geometry of span row i with python values, all rows are converted on the first call.
+        """
+        if self._spans is None:
+            self._spans = list(map(SpanGeometry._make, zip(*(self.columns[field].tolist()
+                                                              for field in GEOMETRY_FIELDS))))
+        return self._spans[i]
+
+    @property
+    def rule_keys(self) -> list:
+        """
+        hashable key of the RULE_GEOMETRY_FIELDS per span row, spans with equal values share one tuple (also with
+        nan whitespace). computed for all rows at once, e.g. for DetectHeaderBase.memo_key.
+        """
+        if self._rule_keys is None:
+            values = np.stack([self.columns[field].astype(float) for field in RULE_GEOMETRY_FIELDS], axis=1)
+            unique, inverse = np.unique(values, axis=0, return_inverse=True)
+            keys = list(map(tuple, unique.tolist()))
+            self._rule_keys = [keys[i] for i in inverse.ravel().tolist()]
+        return self._rule_keys
+
+
+def table_geometry(table: SpanTable) -> TableGeometry:
+    """
+    TableGeometry of @table, cached on the table.
+    """
+    if table.geometry is None:
+        table.geometry = TableGeometry(table)
+    return table.geometry
+
+
+def span_geometry(element) -> SpanGeometry:
+    """
+    SpanGeometry of a span element, cached on the element. read from the geometry of its SpanTable, elements
+    without a table are computed from their bboxes.
+    """
+    geometry = getattr(element, 'geometry', None)
+    if geometry is None:
+        table = element.span_table
+        if table is not None:
+            geometry = table_geometry(table).span(element.span_index)
+        else:
+            page = element.page_info
+            columns = whitespace_geometry(np.array([element.span_styles['bbox']], dtype=float),
+                                          np.array([element.block_styles['bbox']], dtype=float),
+                                          np.array([page.bbox], dtype=float),
+                                          np.array([[page.width, page.height]], dtype=float))
+            geometry = SpanGeometry._make(columns[field].tolist()[0] for field in GEOMETRY_FIELDS)
+        element.geometry = geometry
+    return geometry
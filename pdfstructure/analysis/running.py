@@ -0,0 +1,84 @@
+"""
+detection of running elements (page headers, footers, page numbers): spans that repeat with the same normalized
+text at the same position on many pages of a document. runs once per document on its SpanTable.
+"""
+import math
+import re
+from typing import Dict, Set, Tuple
+import numpy as np
+from pdfstructure.model.spantable import SpanTable
+
+# share of the page height at the top and at the bottom searched for running elements
+RUNNING_MARGIN = 0.12
+# vertical position is compared on a grid of this many points
+POSITION_QUANTUM = 4.0
+# horizontal position: left, center or right third of the page
+POSITION_BANDS = 3
+# a text has to repeat on this share of the pages, but at least on MIN_PAGES pages
+MIN_PAGE_RATIO = 0.3
+MIN_PAGES = 2
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    running text without the parts that change from page to page: case, whitespace and numbers (page numbers,
+    dates), e.g. 'Page 3 of 10' -> 'page # of #'.
+    """
+    return _SPACES.sub(" ", _DIGITS.sub("#", text.lower())).strip()
+
+
+def span_keys(table: SpanTable, margin=RUNNING_MARGIN, quantum=POSITION_QUANTUM) -> Dict[int, Tuple]:
+    """
+    (normalized text, quantized top, horizontal band) of every non-blank span in the top or bottom @margin of
+    its page.
+    @return: {span row: key}
+    """
+    spans = table.spans
+    counts = table.pages['span_stop'] - table.pages['span_start']
+    heights = np.repeat(table.pages['height'], counts)
+    widths = np.repeat(table.pages['width'], counts)
+    bbox = spans['bbox']
+    candidates = np.flatnonzero((bbox[:, 3] <= heights * margin) | (bbox[:, 1] >= heights * (1 - margin)))
+    rows = np.round(bbox[candidates, 1] / quantum).astype(int).tolist()
+    bands = np.clip((bbox[candidates, 0] + bbox[candidates, 2]) / 2 / widths[candidates] * POSITION_BANDS,
+                    0, POSITION_BANDS - 1).astype(int).tolist()
+
+    keys = {}
+    for n, i in enumerate(candidates.tolist()):
+        text = normalize_text(table.span_text(i))
+        if text:
+            keys[i] = (text, rows[n], bands[n])
+    return keys
+
+
+def running_keys(table: SpanTable, min_page_ratio=MIN_PAGE_RATIO, min_pages=MIN_PAGES) -> Set[Tuple]:
+    """
+    keys (see @span_keys) that repeat on enough pages of @table to be running headers / footers.
+    @param table: SpanTable of the document or of a page sample of it
+    """
+    threshold = max(min_pages, math.ceil(min_page_ratio * len(table.pages)))
+    if len(table.pages) < threshold:
+        return set()
+    pages = table.spans['page']
+    key_pages = {}
+    for i, key in span_keys(table).items():
+        key_pages.setdefault(key, set()).add(int(pages[i]))
+    return {key for key, found in key_pages.items() if len(found) >= threshold}
+
+
+def running_mask(table: SpanTable, keys: Set[Tuple] = None) -> np.ndarray:
+    """
+    flag the spans of running headers / footers.
+    @param table: SpanTable of the document, or of some of its pages if @keys is given
+    @param keys: running keys of the document, detected on @table if None
+    @return: boolean array, one entry per span
+    """
+    keys = running_keys(table) if keys is None else keys
+    mask = np.zeros(len(table.spans), dtype=bool)
+    if keys:
+        for i, key in span_keys(table).items():
+            mask[i] = key in keys
+    return mask
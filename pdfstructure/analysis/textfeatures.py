@@ -0,0 +1,96 @@
+"""
+text features of a span shared by the header rules (see pdfstructure.hierarchy.header_rules). computed once per
+span and cached on the element, the rules only read flags instead of scanning the text again.
+"""
+import re
+from string import printable
+
+PRINTABLE = frozenset(printable)
+# ascii text: the str predicates of the rules reduce to character classes, searched in C
+_ASCII_DIGIT = re.compile(r"[0-9]")
+_ASCII_LOWER_WORD = re.compile(r"(?:^| )[^ A-Z]")
+
+
+class TextFeatures:
+    """
+    length: number of characters
+    dot_at_end: a dot in the last 2 characters
+    alpha_count: letters, counted up to 2 (all min_alpha needs)
+    first_alpha: index of the first letter, 0 if there is none
+    computed on first access, most spans are rejected before the rules reading them run:
+    printable: all characters are ascii printable
+    digit_after_alpha: a numeric character at or after first_alpha
+    valid_string: starts with a capital within the first 3 characters, followed by letters, ':' and '?' only
+    title_case: every word (split by ' ') starts with a capital
+    """
+    __slots__ = ('text', 'length', 'dot_at_end', 'alpha_count', 'first_alpha', '_printable', '_digit_after_alpha',
+                 '_valid_string', '_title_case')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.length = len(text)
+        self.dot_at_end = '.' in text[-2:]
+
+        # first letter and whether there is a second one
+        first_alpha = -1
+        self.alpha_count = 0
+        for i, c in enumerate(text):
+            if c.isalpha():
+                if first_alpha < 0:
+                    first_alpha = i
+                    self.alpha_count = 1
+                else:
+                    self.alpha_count = 2
+                    break
+        self.first_alpha = max(first_alpha, 0)
+
+        self._printable = None
+        self._digit_after_alpha = None
+        self._valid_string = None
+        self._title_case = None
+
+    @property
+    def printable(self) -> bool:
+        if self._printable is None:
+            self._printable = self.text.isascii() and PRINTABLE.issuperset(self.text)
+        return self._printable
+
+    @property
+    def digit_after_alpha(self) -> bool:
+        if self._digit_after_alpha is None:
+            tail = self.text[self.first_alpha:]
+            if tail.isascii():
+                self._digit_after_alpha = _ASCII_DIGIT.search(tail) is not None
+            else:
+                self._digit_after_alpha = any(map(str.isnumeric, tail))
+        return self._digit_after_alpha
+
+    @property
+    def valid_string(self) -> bool:
+        if self._valid_string is None:
+            if self.alpha_count == 0 or self.first_alpha >= 3 or not self.text[self.first_alpha].isupper():
+                self._valid_string = False
+            else:
+                rest = self.text[self.first_alpha:].replace(' ', '').replace(':', '').replace('?', '')
+                self._valid_string = not rest or rest.isalpha()
+        return self._valid_string
+
+    @property
+    def title_case(self) -> bool:
+        if self._title_case is None:
+            if self.text.isascii():
+                self._title_case = _ASCII_LOWER_WORD.search(self.text) is None
+            else:
+                self._title_case = all(word[0].isupper() for word in self.text.split(' ') if word)
+        return self._title_case
+
+
+def text_features(element) -> TextFeatures:
+    """
+    TextFeatures of element.text, cached on the element.
+    """
+    features = getattr(element, 'text_features', None)
+    if features is None:
+        features = TextFeatures(element.text)
+        element.text_features = features
+    return features
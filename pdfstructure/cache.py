@@ -0,0 +1,161 @@
+"""
+content addressed on-disk cache of extracted SpanTables.
+a repeated parse of an already processed pdf loads its spans from the cache and skips the PyMuPDF extraction,
+only header rules and tree building run again.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from typing import Optional
+import numpy as np
+from pdfstructure.model.spantable import SpanTable
+
+# bump whenever the extraction or the SpanTable layout changes, invalidates all entries
+CACHE_VERSION = 2
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+HASH_CHUNK = 1024 * 1024
+
+
+def hash_file(file_path) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_buffer(buffer) -> str:
+    return hashlib.sha256(buffer).hexdigest()
+
+
+class SpanCache:
+    """
+    stores one compressed npz file per (content hash, extraction settings) in @directory.
+    entries are touched on every hit, the least recently used ones are evicted once the directory
+    grows beyond @max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(content_hash: str, settings: dict) -> str:
+        """
+        @param content_hash: hash of the pdf content, see @hash_file / @hash_buffer
+        @param settings: extraction settings that change the extracted spans (e.g. page numbers)
+        """
+        settings = dict(settings, version=CACHE_VERSION)
+        return hashlib.sha256("{}:{}".format(content_hash, json.dumps(settings, sort_keys=True)).encode()).hexdigest()
+
+    def path(self, key) -> str:
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key) -> Optional[SpanTable]:
+        path = self.path(key)
+        try:
+            table = SpanTable.load(path)
+        except (OSError, ValueError, KeyError):
+            # missing or unreadable (e.g. truncated) entry
+            self.misses += 1
+            return None
+        self.touch(path)
+        self.hits += 1
+        return table
+
+    @staticmethod
+    def touch(path):
+        """
+        mark the entry at @path as recently used. another process sharing the directory may have evicted it
+        since it was loaded, the loaded entry is valid all the same.
+        """
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def put(self, key, table: SpanTable):
+        self.write(key, table.arrays())
+
+    def write(self, key, arrays: dict):
+        """
+        store numpy @arrays as compressed npz entry @key.
+        """
+        # write to a temp file first, concurrent readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                np.savez_compressed(fp, **arrays)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        delete least recently used entries until the cache fits into max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+
+    @property
+    def size(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.directory, name))
+                   for name in os.listdir(self.directory) if name.endswith(".npz"))
+
+
+class PageCache(SpanCache):
+    """
+    keeps the last parse of a document under its identity (e.g. its path) instead of its content:
+    the SpanTable, a content hash per page and the header label of every span.
+    a re-parse of an edited document only extracts and classifies the pages whose hash changed,
+    see FileSource(page_cache=...).
+    """
+
+    def get_entry(self, key) -> Optional[dict]:
+        """
+        @return: {'table': SpanTable, 'page_hashes': [str, ...] per table page, 'labels': int8 array per span
+                  (-1 unknown, 0 content, 1 header), 'rules': str, 'style_hash': str} or None
+        """
+        path = self.path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = {'table': SpanTable.from_arrays(data),
+                         'page_hashes': [h.decode() for h in data['page_hashes'].tolist()],
+                         'labels': data['labels'].copy(),
+                         'rules': data['rules'].tobytes().decode('utf-8'),
+                         'style_hash': data['style_hash'].tobytes().decode('utf-8')}
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.touch(path)
+        self.hits += 1
+        return entry
+
+    def put_entry(self, key, table: SpanTable, page_hashes, labels, rules: str, style_hash: str):
+        arrays = table.arrays()
+        arrays.update(page_hashes=np.array([h.encode() for h in page_hashes], dtype='S64'),
+                      labels=np.asarray(labels, dtype='i1'),
+                      rules=np.frombuffer(rules.encode('utf-8'), dtype='u1'),
+                      style_hash=np.frombuffer(style_hash.encode('utf-8'), dtype='u1'))
+        self.write(key, arrays)
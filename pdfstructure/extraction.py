@@ -0,0 +1,191 @@
+"""
+page extraction layer: pulls the text dict of every page from PyMuPDF exactly once.
+the extracted pages are collected in a columnar SpanTable that is shared by the document
+style statistics and the span stream (FileSource.read_blocks).
+"""
+import hashlib
+import mmap
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Generator, List
+import fitz
+from pdfstructure.model.spantable import SpanTable, StyleIndex
+
+# page ranges handed out per worker, more chunks than workers balance uneven pages
+CHUNKS_PER_WORKER = 4
+
+
+def extract_page(page) -> dict:
+    """
+    extract text dict and geometry of a single page.
+    no reference to the fitz.Page is kept, the document can be closed once its pages are extracted.
+    @param page: fitz.Page
+    @return: {'number', 'width', 'height', 'bbox', 'rotation', 'blocks'}
+    """
+    rect = page.rect
+    return {'number': page.number,
+            'width': rect.width,
+            'height': rect.height,
+            'bbox': tuple(rect),
+            'rotation': page.rotation,
+            'blocks': page.get_text("dict", sort=True)["blocks"],
+            }
+
+
+def page_hashes(doc, page_numbers) -> List[str]:
+    """
+    content hash per page: the page's content streams plus the form xobjects and font objects it uses.
+    much cheaper than the text extraction, used to find the pages of a republished document that changed.
+    @param doc: fitz.Document
+    @param page_numbers: page indices
+    """
+    # objects shared by many pages (fonts, logos) are hashed once
+    objects = {}
+
+    def object_digest(xref):
+        if xref not in objects:
+            digest = hashlib.sha256(doc.xref_object(xref, compressed=True).encode())
+            if doc.xref_is_stream(xref):
+                digest.update(doc.xref_stream_raw(xref))
+            objects[xref] = digest.digest()
+        return objects[xref]
+
+    hashes = []
+    for number in page_numbers:
+        page = doc.load_page(number)
+        digest = hashlib.sha256(page.read_contents())
+        digest.update(repr((tuple(page.rect), page.rotation)).encode())
+        for xobject in page.get_xobjects():
+            if xobject[0] > 0:
+                digest.update(object_digest(xobject[0]))
+        for font in page.get_fonts():
+            if font[0] > 0:
+                digest.update(doc.xref_object(font[0], compressed=True).encode())
+        hashes.append(digest.hexdigest())
+    return hashes
+
+
+def select_pages(doc, page_numbers=None) -> List[int]:
+    """
+    validate requested page numbers (0-based, like pdfminer's page_numbers).
+    @param doc: fitz.Document
+    @param page_numbers: iterable of page indices, None selects all pages
+    @return: sorted list of unique page indices
+    """
+    if page_numbers is None:
+        return list(range(doc.page_count))
+    numbers = sorted(set(page_numbers))
+    for number in numbers:
+        if not 0 <= number < doc.page_count:
+            raise ValueError("page number {} out of range, document has {} pages".format(number, doc.page_count))
+    return numbers
+
+
+def iter_pages(doc, page_numbers=None) -> Generator[dict, None, None]:
+    """
+    yields extracted page dicts in page order, only requested pages are loaded.
+    @param doc: fitz.Document
+    @param page_numbers: page indices to extract, None extracts all pages
+    """
+    for number in select_pages(doc, page_numbers):
+        yield extract_page(doc.load_page(number))
+
+
+def page_ranges(page_count: int, chunks: int) -> List[range]:
+    """
+    split page indices into (at most) @chunks contiguous, disjoint ranges.
+    """
+    chunks = max(1, min(chunks, page_count))
+    step, rest = divmod(page_count, chunks)
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        stop = start + step + (1 if i < rest else 0)
+        ranges.append(range(start, stop))
+        start = stop
+    return ranges
+
+
+def extract_table(doc, page_numbers=None, timings: dict = None, index: StyleIndex = None) -> SpanTable:
+    """
+    extract all (requested) pages straight into a SpanTable, only one page dict is alive at a time.
+    @param doc: fitz.Document
+    @param page_numbers: page indices to extract, None extracts all pages
+    @param timings: optional dict, receives the time spent in seconds under key 'extract'
+    @param index: StyleIndex shared with other tables of the document
+    """
+    start = time.perf_counter()
+    table = SpanTable.from_pages(iter_pages(doc, page_numbers), index=index)
+    if timings is not None:
+        timings['extract'] = timings.get('extract', 0.0) + time.perf_counter() - start
+    return table
+
+
+def map_file(file_path) -> mmap.mmap:
+    """
+    read-only memory map of a file.
+    """
+    with open(file_path, "rb") as fp:
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def open_mmap(file_path):
+    """
+    open a pdf through a read-only memory map, PyMuPDF reads the mapped pages without copying the file.
+    the memoryview kept by the document holds the map open.
+    """
+    return fitz.open(stream=memoryview(map_file(file_path)), filetype="pdf")
+
+
+def open_document(filename=None, stream=None, use_mmap=False):
+    """
+    open a pdf from a path, a memory map of a path or an in-memory buffer (bytes / memoryview).
+    the keyword arguments are the picklable spec a Source hands to extraction workers.
+    """
+    if use_mmap:
+        return open_mmap(filename)
+    if stream is not None:
+        return fitz.open(stream=stream, filetype="pdf")
+    return fitz.open(filename)
+
+
+# document opened once per worker process by @_init_worker
+_worker_doc = None
+
+
+def _init_worker(spec: dict):
+    global _worker_doc
+    _worker_doc = open_document(**spec)
+
+
+def _extract_range(numbers: List[int]) -> SpanTable:
+    """
+    worker: extracts the given pages of the document opened by @_init_worker.
+    """
+    return SpanTable.from_pages(extract_page(_worker_doc.load_page(i)) for i in numbers)
+
+
+def extract_table_parallel(doc, spec: dict, workers: int, page_numbers=None, timings: dict = None) -> SpanTable:
+    """
+    extract all (requested) pages of a document with a pool of worker processes.
+    every worker opens the pdf itself and extracts disjoint page ranges into SpanTables, the tables are merged
+    in page order and are identical to @extract_table.
+    @param doc: fitz.Document opened in the calling process
+    @param spec: keyword arguments of @open_document the workers open the pdf with
+    @param workers: number of worker processes
+    @param page_numbers: page indices to extract, None extracts all pages
+    @param timings: optional dict, receives the time spent in seconds under key 'extract'
+    """
+    numbers = select_pages(doc, page_numbers)
+    if workers <= 1 or len(numbers) < 2:
+        return extract_table(doc, numbers, timings=timings)
+
+    start = time.perf_counter()
+    chunks = [numbers[r.start:r.stop] for r in page_ranges(len(numbers), workers * CHUNKS_PER_WORKER)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_init_worker,
+                             initargs=(spec,)) as pool:
+        # map keeps the order of the submitted chunks -> tables come back in page order
+        table = SpanTable.concat(list(pool.map(_extract_range, chunks)))
+    if timings is not None:
+        timings['extract'] = timings.get('extract', 0.0) + time.perf_counter() - start
+    return table
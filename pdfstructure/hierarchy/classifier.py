@@ -0,0 +1,261 @@
+"""
+trainable header detection: a logistic regression over span features (size vs common size, flags, whitespace,
+text features) as alternative to the hand written rules of DetectHeaderKID. the features of all spans of a
+SpanTable are collected into one matrix and classified with a single matrix product.
+
+the shipped model (header_model.json) is trained on the labels the viewer collects in output.csv:
+python -m pdfstructure.hierarchy.classifier data/sample_kids output.csv -o pdfstructure/hierarchy/header_model.json
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Tuple
+import numpy as np
+
+from pdfstructure.analysis.geometry import table_geometry
+from pdfstructure.analysis.textfeatures import TextFeatures
+from pdfstructure.hierarchy.detectheader import DetectHeaderBase, Rule
+from pdfstructure.model.spantable import SpanTable
+from pdfstructure.source import FileSource
+from mu_helper import FLAG_BOLD, FLAG_ITALIC
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(__file__), "header_model.json")
+
+# columns of the feature matrix, see @span_features
+FEATURES = ('size_ratio', 'bold', 'italic', 'color_differs', 'font_differs',
+            'whitespace_left', 'whitespace_right', 'whitespace_ratio', 'center_deviation', 'page_y0',
+            'log_length', 'min_alpha', 'digit_after_alpha', 'printable', 'valid_string', 'title_case', 'dot_at_end',
+            'colon_at_end', 'log_block_spans', 'log_line_spans')
+
+
+def span_features(table: SpanTable, doc_styles, rows=None) -> np.ndarray:
+    """
+    feature matrix of the spans of @table, one row per span and one column per name in FEATURES.
+    style and geometry columns are numpy operations over the table, the text columns come from TextFeatures.
+    @param doc_styles: source.font_info of the document
+    @param rows: span rows to describe, all spans if None
+    @return: float array of shape (spans, len(FEATURES))
+    """
+    rows = np.arange(len(table.spans)) if rows is None else np.asarray(rows, dtype=np.int64)
+    spans = table.spans[rows]
+    font_stats = doc_styles['font_stats']
+    geometry = table_geometry(table)
+    X = np.zeros((len(rows), len(FEATURES)))
+
+    size_q = table.styles['size_q'][spans['style']]
+    X[:, 0] = size_q / max(font_stats['common_size_q'], 1)
+    X[:, 1] = spans['flags'] & FLAG_BOLD != 0
+    X[:, 2] = spans['flags'] & FLAG_ITALIC != 0
+    X[:, 3] = spans['color'] != font_stats['common_color']
+    X[:, 4] = spans['font'] != font_stats['common_font_id']
+    # whitespace percentages are nan where there is nothing to compare, treated as no whitespace
+    for column, field in ((5, 'whitespace_left'), (6, 'whitespace_right'), (7, 'whitespace_ratio')):
+        X[:, column] = np.nan_to_num(geometry.columns[field][rows]) / 100
+    X[:, 8] = np.minimum(geometry.center_deviation[rows], 100) / 100
+    X[:, 9] = geometry.page_y0[rows]
+    X[:, 10] = np.log1p(spans['text_end'] - spans['text_start'])
+
+    text_columns = []
+    for start, end in zip(spans['text_start'].tolist(), spans['text_end'].tolist()):
+        text = table.text[start:end]
+        features = TextFeatures(text)
+        text_columns.append((features.alpha_count >= 2, features.digit_after_alpha, features.printable,
+                             features.valid_string, features.title_case, features.dot_at_end,
+                             text.rstrip().endswith(':')))
+    if text_columns:
+        X[:, 11:18] = text_columns
+
+    blocks = table.blocks[spans['block']]
+    lines = table.lines[spans['line']]
+    X[:, 18] = np.log(blocks['span_stop'] - blocks['span_start'])
+    X[:, 19] = np.log(lines['span_stop'] - lines['span_start'])
+    return X
+
+
+class HeaderModel:
+    """
+    logistic regression on standardized features: p(header) = sigmoid(((X - mean) / scale) @ weights + bias)
+    """
+
+    def __init__(self, weights, bias=0., mean=None, scale=None, threshold=0.5, features=FEATURES):
+        self.features = tuple(features)
+        self.weights = np.asarray(weights, dtype=float)
+        self.bias = float(bias)
+        self.mean = np.zeros(len(self.weights)) if mean is None else np.asarray(mean, dtype=float)
+        self.scale = np.ones(len(self.weights)) if scale is None else np.asarray(scale, dtype=float)
+        self.threshold = threshold
+
+    @classmethod
+    def fit(cls, X: np.ndarray, y: np.ndarray, l2=1.0, iterations=25, threshold=0.5) -> 'HeaderModel':
+        """
+        fit by newton iterations (IRLS), the features are few so the hessian is small.
+        @param X: feature matrix, see @span_features
+        @param y: 1 for headers, 0 otherwise
+        @param l2: ridge penalty on the weights (not on the bias)
+        """
+        mean = X.mean(axis=0)
+        scale = X.std(axis=0)
+        scale[scale == 0] = 1
+        Z = np.hstack([(X - mean) / scale, np.ones((len(X), 1))])
+        penalty = np.full(Z.shape[1], l2)
+        penalty[-1] = 0
+        theta = np.zeros(Z.shape[1])
+        for _ in range(iterations):
+            p = 1 / (1 + np.exp(-Z @ theta))
+            gradient = Z.T @ (p - y) + penalty * theta
+            hessian = (Z * (p * (1 - p))[:, None]).T @ Z + np.diag(penalty)
+            step = np.linalg.solve(hessian, gradient)
+            theta -= step
+            if np.abs(step).max() < 1e-8:
+                break
+        return cls(theta[:-1], theta[-1], mean, scale, threshold)
+
+    def decision(self, X: np.ndarray) -> np.ndarray:
+        return ((X - self.mean) / self.scale) @ self.weights + self.bias
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return 1 / (1 + np.exp(-self.decision(X)))
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.predict_proba(X) >= self.threshold
+
+    def to_dict(self) -> dict:
+        return {'features': list(self.features), 'weights': self.weights.tolist(), 'bias': self.bias,
+                'mean': self.mean.tolist(), 'scale': self.scale.tolist(), 'threshold': self.threshold}
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(json.dumps(self.to_dict(), sort_keys=True).encode()).hexdigest()[:16]
+
+    def save(self, path):
+        with open(path, "w") as fp:
+            json.dump(self.to_dict(), fp, indent=1)
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH) -> 'HeaderModel':
+        with open(path) as fp:
+            data = json.load(fp)
+        if tuple(data['features']) != FEATURES:
+            raise ValueError("model {} was trained on other features: {}".format(path, data['features']))
+        return cls(data['weights'], data['bias'], data['mean'], data['scale'], data['threshold'], data['features'])
+
+
+@lru_cache(maxsize=1)
+def default_model() -> HeaderModel:
+    """ the shipped model, loaded on first use"""
+    return HeaderModel.load(DEFAULT_MODEL_PATH)
+
+
+def model_header(element, doc_styles, model: HeaderModel = None) -> bool:
+    """ span classified as header by @model, single span variant of @model_header_batch (slow, prefer batch)"""
+    model = model or default_model()
+    return bool(model.predict(span_features(element.span_table, doc_styles, [element.span_index]))[0])
+
+
+def model_header_batch(table, doc_styles, model: HeaderModel = None):
+    model = model or default_model()
+    return model.predict(span_features(table, doc_styles))
+
+
+class DetectHeaderModel(DetectHeaderBase):
+    """
+    DetectHeader backed by the trained HeaderModel at DEFAULT_MODEL_PATH, use as header_conditions_cls of the
+    HierarchyParser. the model is a single batch rule: the parser classifies every span table at once.
+    """
+    rules = (
+        Rule('model', model_header, cost=1.0, doc=True, batch=model_header_batch),
+    )
+    # the features include the page position and the block, the verdicts of repeated texts differ
+    memoizable = False
+
+    @classmethod
+    def rules_name(cls) -> str:
+        # cached labels of an earlier model are not reused after retraining
+        return "{}@{}".format(super().rules_name(), default_model().digest)
+
+
+def read_labels(csv_path) -> Dict[str, int]:
+    """
+    span text -> label (1 heading, 0 other) of a label file as written by the viewer (columns text, label).
+    texts labelled both ways are left out.
+    """
+    labels = defaultdict(set)
+    with open(csv_path, newline="") as fp:
+        for row in csv.reader(fp):
+            if len(row) < 2 or row[:2] == ['text', 'label']:
+                continue
+            labels[row[0]].add(int(row[1]))
+    return {text: found.pop() for text, found in labels.items() if len(found) == 1}
+
+
+def labelled_spans(file_path, labels: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    features and labels of the spans of a document the parser sees (running headers / footers are dropped)
+    whose text is labelled in @labels.
+    @return: X, y
+    """
+    rows = defaultdict(list)
+    with FileSource(file_path) as source:
+        doc_styles = source.font_info
+        for element in source.read_blocks():
+            if element.text in labels:
+                rows[element.span_table].append((element.span_index, labels[element.text]))
+    X, y = [np.zeros((0, len(FEATURES)))], [np.zeros(0)]
+    for table, labelled in rows.items():
+        X.append(span_features(table, doc_styles, [i for i, _ in labelled]))
+        y.append(np.array([label for _, label in labelled], dtype=float))
+    return np.vstack(X), np.concatenate(y)
+
+
+def training_data(files: List[str], labels: Dict[str, int]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    {file: (X, y)} of the labelled spans of every file, documents without labelled spans are left out.
+    """
+    data = {}
+    for file_path in files:
+        X, y = labelled_spans(file_path, labels)
+        if len(y):
+            data[file_path] = X, y
+    return data
+
+
+def scores(predicted: np.ndarray, y: np.ndarray) -> dict:
+    predicted, y = predicted.astype(bool), y.astype(bool)
+    tp = int((predicted & y).sum())
+    return {'spans': len(y),
+            'accuracy': float((predicted == y).mean()) if len(y) else None,
+            'precision': tp / int(predicted.sum()) if predicted.any() else None,
+            'recall': tp / int(y.sum()) if y.any() else None}
+
+
+def main(argv=None):
+    from pdfstructure.runner import collect_files
+
+    parser = argparse.ArgumentParser(description="train the header classifier on labelled spans")
+    parser.add_argument("inputs", nargs="+", help="pdf files or directories the labels were collected from")
+    parser.add_argument("labels", help="csv file with text and label columns, e.g. output.csv of the viewer")
+    parser.add_argument("-o", "--output", default=DEFAULT_MODEL_PATH, help="model file to write")
+    parser.add_argument("--l2", type=float, default=1.0, help="ridge penalty")
+    parser.add_argument("--threshold", type=float, default=0.5, help="header probability threshold")
+    args = parser.parse_args(argv)
+
+    data = training_data(collect_files(args.inputs), read_labels(args.labels))
+    if not data:
+        print("no labelled spans found", file=sys.stderr)
+        return 1
+    X = np.vstack([X for X, _ in data.values()])
+    y = np.concatenate([y for _, y in data.values()])
+    model = HeaderModel.fit(X, y, l2=args.l2, threshold=args.threshold)
+    model.save(args.output)
+    print("trained on {} spans of {} documents ({} headers): {}".format(
+        len(y), len(data), int(y.sum()), scores(model.predict(X), y)), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,10 @@
-from string import printable
-from pdfstructure.utils import word_generator
-
-from mu_helper import Whitespace
+from pdfstructure.analysis.geometry import span_geometry, table_geometry
+from pdfstructure.analysis.textfeatures import text_features
+from mu_helper import FLAG_BOLD, FLAG_ITALIC
 
 # INDIVIDUAL CONDITIONS TO ANALYSE HEADER. HAVE TO RETURN TRUE TO PASS HEADER TEST
+# text conditions read the TextFeatures of the span (pdfstructure.analysis.textfeatures), the text is scanned once.
+# whitespace conditions read the SpanGeometry of the span (pdfstructure.analysis.geometry), computed per SpanTable
 #######################################################################################################################
 # TODO: ADD MORE RULES TO DETERMINE IF HEADER OR NOT LIKE:
 # DOES LINE START WITH NUMBER, ROMAN NUMBER....
@@ -14,12 +15,14 @@ def min_length(element, min_letters=3):
     min letters: int
     :return: bool
     """
-    return len(element.text) >= min_letters
+    return text_features(element).length >= min_letters
 
 
+# style only conditions (span_size_larger_than_common, span_color_differ_than_common, span_style_differ_than_common,
+# check_bold, check_italic): declare them with Rule(..., style=True), they run once per distinct style then
 def span_size_larger_than_common(element, doc_font):
     """ font size differs from common font"""
-    return element.span_styles['font_stats']['size'] > doc_font['font_stats']['common_size']
+    return element.span_styles['font_stats']['size_q'] > doc_font['font_stats']['common_size_q']
 
 
 def span_color_differ_than_common(element, doc_font):
@@ -29,7 +32,7 @@ def span_color_differ_than_common(element, doc_font):
 
 def span_style_differ_than_common(element, doc_font)->bool:
     """ font name differs from common font"""
-    return element.span_styles['font_stats']['font'] != doc_font['font_stats']['common_font']
+    return element.span_styles['font_stats']['font_id'] != doc_font['font_stats']['common_font_id']
 
 
 def min_alpha(element)->bool:
@@ -38,92 +41,42 @@ def min_alpha(element)->bool:
     @param element:
     @return:
     """
-    alpha_count = 0
-    numeric_count = 0
-    for word in word_generator(element):
-        for c in word:
-            if c.isalpha():
-                alpha_count += 1
-            if c.isnumeric():
-                numeric_count += 1
-
-            if alpha_count >= 2:
-                return True
-    return False
+    return text_features(element).alpha_count >= 2
 
 
 def check_special_char(element)->bool:
-    if set(element.text).difference(printable):
-        return False
-    else:
-        return True
+    # only ascii printable characters
+    return text_features(element).printable
 
 def no_dot_at_end(element)->bool:
     # checks if text doesn't end with a dot
-    return not '.' in element.text[-2:]
+    return not text_features(element).dot_at_end
 
 def is_title(element)->bool:
+    # bold / italic spans or every word capitalized
     if check_bold(element) == False and check_italic(element) == False:
-        cond = 0
-        s = element.text.split(' ')
-        if cond == 0:
-            if any(word[0].isupper() == False for word in s if word):
-                cond = 0
-            else:
-                cond = 1
-                    
-        elif cond == 0:
-            if any(word.isupper() == False for word in s if word):
-                cond = 0
-            else:
-                cond = 1
-                
-        if cond == 1:
-            return True
-        else:
-            return False
+        return text_features(element).title_case
     else:
         return True
 
 def check_digit(element)->bool:
-    ele = element.text
-    try:
-        first_alph = ele.find(next(filter(str.isalpha, ele)))
-    except:
-        first_alph = 0
-    if any(i.isnumeric() for i in ele[first_alph:]):
-        return False
-    else:
-        return True
+    # no numbers from the first letter on
+    return not text_features(element).digit_after_alpha
 
 
 def check_bold(element)->bool:
-    #checks if bold in font name
+    #checks bold flag of the span
     return element.span_styles['font_stats']['bold']
 
 
 def check_italic(element)->bool:
-    # checks if italic in font name
+    # checks italic flag of the span
     return element.span_styles['font_stats']['italic']
 
 
 def string_validity(element)->bool:
-    ele = element.text
-    try:
-        first_alph = ele.find(next(filter(str.isalpha, ele)))
-    except:
-        first_alph = 0
-    check = []
-    if first_alph < 3 and ele[first_alph].isupper() == True:
-        for e in ele[first_alph:].replace(' ', ''):
-            if e.isalpha() == True or e == ':' or e == '?':
-                check.append(True)
-            else:
-                check.append(False)
-        if any(char is False for char in check):
-            return False
-        else:
-            return True
+    # capital letter within the first 3 characters, then only letters, ':' and '?'
+    return text_features(element).valid_string
 
 def centered(element, threshold=10)->bool:
     """
@@ -132,9 +85,8 @@ def centered(element, threshold=10)->bool:
     :param threshold: percentage how much center can deviate from mid to still be centered (10 = 10% of mid vs width
     :return:
     """
-    ws = Whitespace(element.block_styles['bbox'], element.span_styles['bbox'])
-
-    return ws.is_centered(threshold) if not ws.one_span else Whitespace(element.page_info.bbox, element.span_styles['bbox'])
+    geometry = span_geometry(element)
+    return geometry.valid and (geometry.one_span or geometry.center_deviation < threshold)
 
 
 
@@ -145,11 +97,7 @@ def lSpaces(element, min_space=10)->bool:
     :param threshold: percentage how much left space (10 = 10% of ls vs width)
     :return:
     """
-
-    ws = Whitespace(element.block_styles['bbox'], element.span_styles['bbox'])
-
-    return ws.whitespace_left > min_space if not ws.one_span else Whitespace(element.page_info.bbox,
-                                                            element.span_styles['bbox']).whitespace_left > min_space
+    return span_geometry(element).whitespace_left > min_space
 
 
 def rSpaces(element, min_space=20)->bool:
@@ -159,11 +107,7 @@ def rSpaces(element, min_space=20)->bool:
      :param threshold: percentage how much right space (10 = 10% of ls vs width)
      :return: bool
      """
-
-    ws = Whitespace(element.block_styles['bbox'], element.span_styles['bbox'])
-
-    return ws.whitespace_right > min_space if not ws.one_span else Whitespace(element.page_info.bbox,
-                                                            element.span_styles['bbox']).whitespace_right > min_space
+    return span_geometry(element).whitespace_right > min_space
 
 def whitespace_ratio(element, min_ratio=20) ->bool:
     """
@@ -172,7 +116,48 @@ def whitespace_ratio(element, min_ratio=20) ->bool:
       :param threshold: percentage how much right space (10 = 10% of ls vs width)
       :return: bool ie ws > threshold
       """
-    ws = Whitespace(element.block_styles['bbox'], element.span_styles['bbox'])
+    return span_geometry(element).whitespace_ratio > min_ratio
+
+
+# BATCH VARIANTS: SAME CONDITIONS AS NUMPY OPERATIONS OVER ALL SPANS OF A SpanTable (PAGE OR DOCUMENT).
+# HAVE TO RETURN A BOOLEAN ARRAY (ONE ENTRY PER SPAN) MATCHING THE PER SPAN CONDITION.
+# spans the per span conditions can not compare (zero widths, span right of its block) are False in all of them,
+# their whitespace percentages are nan in the TableGeometry
+#######################################################################################################################
+
+
+def span_size_larger_than_common_batch(table, doc_font):
+    return table.styles['size_q'][table.spans['style']] > doc_font['font_stats']['common_size_q']
+
+
+def span_color_differ_than_common_batch(table, doc_font):
+    return table.spans['color'] != doc_font['font_stats']['common_color']
+
+
+def span_style_differ_than_common_batch(table, doc_font):
+    return table.spans['font'] != doc_font['font_stats']['common_font_id']
+
+
+def check_bold_batch(table, doc_font):
+    return table.spans['flags'] & FLAG_BOLD != 0
+
+
+def check_italic_batch(table, doc_font):
+    return table.spans['flags'] & FLAG_ITALIC != 0
+
+
+def centered_batch(table, doc_font, threshold=10):
+    geometry = table_geometry(table)
+    return geometry.valid & (geometry.one_span | (geometry.center_deviation < threshold))
+
+
+def lSpaces_batch(table, doc_font, min_space=10):
+    return table_geometry(table).whitespace_left > min_space
+
+
+def rSpaces_batch(table, doc_font, min_space=20):
+    return table_geometry(table).whitespace_right > min_space
+
 
-    return ws.whitespace_ratio > min_ratio if not ws.one_span else Whitespace(element.page_info.bbox,
-                                                            element.span_styles['bbox']).whitespace_ratio > min_ratio
+def whitespace_ratio_batch(table, doc_font, min_ratio=20):
+    return table_geometry(table).whitespace_ratio > min_ratio
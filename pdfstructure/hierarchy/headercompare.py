@@ -2,6 +2,7 @@ import re
 
 from pdfstructure.model.document import Section
 from pdfstructure.utils import word_generator
+from mu_helper import SIZE_QUANTUM
 
 numeration_pattern = re.compile("^(?=.*\d+)((?=.*\.)|(?=.*:)).*$")
 white_space_pattern = re.compile("\\s+")
@@ -86,5 +87,5 @@ def condition_h1_slightly_bigger_h2(h1: Section, h2: Section):
     @param h2:
     @return:
     """
-    return h1.span_styles['font_stats']['size'] == h2.span_styles['font_stats']['size'] \
-           and h1.span_styles['font_stats']['size'] - h2.span_styles['font_stats']['size'] > 1.0
+    return h1.span_styles['font_stats']['size_q'] == h2.span_styles['font_stats']['size_q'] \
+           and h1.span_styles['font_stats']['size_q'] - h2.span_styles['font_stats']['size_q'] > SIZE_QUANTUM
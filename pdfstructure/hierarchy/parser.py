@@ -1,16 +1,43 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import List, Generator
+from typing import List, Generator, AsyncGenerator, Callable, Union
 from pdfstructure.hierarchy.headercompare import get_default_sub_header_conditions
-from pdfstructure.model.document import TextElement, Section, StructuredPdfDocument, DanglingTextSection
+from pdfstructure.hierarchy.rulememo import RuleMemo
+from pdfstructure.hierarchy.rulestats import RuleStats
+from pdfstructure.model.document import TextElement, Section, StructuredPdfDocument, ParagraphElement
+from pdfstructure.model.sectiontree import SectionTree, DanglingTreeSection
 from pdfstructure.source import Source
 from mu_helper import Whitespace
 
 
 class HierarchyParser:
 
-    def __init__(self, header_conditions_cls, sub_header_conditions=get_default_sub_header_conditions()):
+    def __init__(self, header_conditions_cls, sub_header_conditions=get_default_sub_header_conditions(), batch=True,
+                 instrument=False, exhaustive=False, memo_size=0, coalesce=True):
+        """
+        @param header_conditions_cls: header detection, see pdfstructure.hierarchy.detectheader
+        @param batch: evaluate the header rules that have a numpy variant per span table instead of per span
+        @param instrument: record time, pass / fail and deciding rejections per rule (per span path, no batch).
+                           every document gets a RuleStats in metadata['rule_stats'], @rule_stats aggregates them
+        @param exhaustive: instrumentation evaluates all rules of every span, see DetectHeaderBase.check_instrumented
+        @param memo_size: verdicts kept per document for repeated spans (see pdfstructure.hierarchy.rulememo), e.g.
+                          DEFAULT_MEMO_SIZE. off by default: key and lookup cost about 1.4us per span, as much as the
+                          batched KID rules, it pays off for per span rules on documents repeating a lot of text
+                          (hit rates above ~30%). the hit / miss counters of a document are in metadata['rule_memo']
+        @param coalesce: consecutive content spans of a block become one content section (a ParagraphElement),
+                         False keeps a section per span
+        """
         self._isSubHeader = sub_header_conditions
         self.header_conditions_cls = header_conditions_cls
+        self.batch = batch and header_conditions_cls.has_batch and not instrument
+        self.instrument = instrument
+        self.exhaustive = exhaustive
+        # stats of all documents parsed by this parser
+        self.rule_stats = RuleStats() if instrument else None
+        self.memo_size = memo_size if header_conditions_cls.memoizable and not instrument else 0
+        self.coalesce = coalesce
 
     def structure_document(self, source: Source) -> StructuredPdfDocument:
         """
@@ -18,16 +45,46 @@ class HierarchyParser:
         @param source:
         @return:
         """
-        structured_elements = self.create_hierarchy(source)
-        
+        stats, memo = self.document_state()
+        structured_elements = self.create_hierarchy(source, stats, memo)
+        return self.wrap_document(source.uri, structured_elements, source.font_info, stats, memo)
+
+    def document_state(self):
+        """
+        per document rule state: RuleStats (instrument=True) and RuleMemo (memo_size), None where not used.
+        @return: stats, memo
+        """
+        stats = RuleStats() if self.instrument else None
+        memo = RuleMemo(self.memo_size) if self.memo_size else None
+        return stats, memo
+
+    @staticmethod
+    def wrap_document(uri, elements, font_info, stats: RuleStats = None, memo: RuleMemo = None) \
+            -> StructuredPdfDocument:
         # create wrapped document and capture some metadata
-        structured_document = StructuredPdfDocument(uri=source.uri, elements=structured_elements, style_info=source.font_info)
-        
+        structured_document = StructuredPdfDocument(uri=uri, elements=elements, style_info=font_info)
+        if stats is not None:
+            structured_document.update_metadata("rule_stats", stats)
+        if memo is not None:
+            structured_document.update_metadata("rule_memo", memo.to_dict())
         return structured_document
 
-    def create_hierarchy(self, source) -> List[Section]:
+    def create_hierarchy(self, source, stats: RuleStats = None, memo: RuleMemo = None) -> List[Section]:
+        """
+        Takes incoming flat list of paragraphs and creates nested natural order hierarchy, see @iter_sections.
+        @param source:
+        @param stats: receives the rule instrumentation of this document (instrument=True)
+        @param memo: verdict memo of this document, a new one of memo_size if None
+        @return: top level sections
+        """
+        return list(self.iter_sections(source, stats, memo))
+
+    def iter_sections(self, source, stats: RuleStats = None, memo: RuleMemo = None) -> Generator[Section, None, None]:
         """
         Takes incoming flat list of paragraphs and creates nested natural order hierarchy.
+        top level sections are yielded as soon as they are complete, i.e. once the next top level section starts,
+        so writers (e.g. PrettyStringFilePrinter.print_sections) start before the document is parsed. sections the
+        caller does not keep are freed, with a lazy FileSource memory stays bounded by the largest section.
 
         Example Structure:
         ==================
@@ -45,15 +102,32 @@ class HierarchyParser:
             content
         >>
 
-        @param block_gen:
-        @return:
+        @param source:
+        @param stats: receives the rule instrumentation of this document (instrument=True)
+        @param memo: verdict memo of this document, a new one of memo_size if None
+        @return: top level sections in document order
         """
 
+        # every top level section has its own SectionTree, it is dropped with the section
         structured = []
+        tree = None
+        # nodes of the open headers in tree
         level_stack = []
-        all_elements=[]
+        # element of the last content section while it can take more spans of its block (coalesce)
+        paragraph = None
         element_gen = source.read_blocks()
         doc_style = source.font_info
+        # header labels of an earlier parse (incremental sources), only unknown spans are classified
+        rules = self.header_conditions_cls.rules_name()
+        labels = source.header_labels(rules)
+        # batch mode: rule results of the span table the current element belongs to (a page or the document)
+        batch_table, batch_values = None, None
+        if self.instrument and stats is None:
+            stats = RuleStats()
+        # style only rules are evaluated once per distinct style of the document
+        style_filter = self.header_conditions_cls.style_filter(doc_style)
+        if memo is None and self.memo_size:
+            memo = RuleMemo(self.memo_size)
         
 
         for element in element_gen:
@@ -62,81 +136,117 @@ class HierarchyParser:
             element.page_w = doc_style['page_w']
             element.page_h = doc_style['page_h']
             
-            if self.header_conditions_cls(element,doc_style).check_condition_pipeline():
+            if labels is not None and labels[element.span_index] >= 0:
+                is_header = bool(labels[element.span_index])
+            elif stats is not None:
+                is_header = self.header_conditions_cls.check_instrumented(element, doc_style, stats, self.exhaustive,
+                                                                          style_filter)
+            else:
+                # repeated spans reuse the verdict of their first occurrence
+                key = self.header_conditions_cls.memo_key(element) if memo is not None else None
+                is_header = memo.get(key) if key is not None else None
+                if is_header is None:
+                    if self.batch:
+                        if element.span_table is not batch_table:
+                            batch_table = element.span_table
+                            batch_values = self.header_conditions_cls.evaluate_batch(batch_table, doc_style)
+                        is_header = self.header_conditions_cls.check_batched(element, doc_style, batch_values,
+                                                                             style_filter)
+                    else:
+                        is_header = self.header_conditions_cls.check(element, doc_style, style_filter)
+                    if key is not None:
+                        memo.put(key, is_header)
+            if labels is not None and labels[element.span_index] < 0:
+                labels[element.span_index] = is_header
+
+            if is_header:
                 element.label = 'heading' 
-                child = Section(element)
-                header_size = element.span_styles['font_stats']['size']
+                paragraph = None
+                header_size = element.span_styles['font_stats']['size_q']
                
                 # print(element.text)
                 # initial state - push and continue with next block
                 if not level_stack:
-                    self.__push_to_stack(child, level_stack, structured)
+                    tree = self.__push_to_stack(element, tree, level_stack, structured)
                     continue
 
-                stack_peek_size = level_stack[-1].span_styles['font_stats']['size']
+                stack_peek_size = tree.elements[level_stack[-1]].span_styles['font_stats']['size_q']
         
                 if stack_peek_size > header_size:
                     # append block as children
-                    self.__push_to_stack(child, level_stack, structured)
+                    tree = self.__push_to_stack(element, tree, level_stack, structured)
         
                 else:
                     # go up in hierarchy and insert block (as children) on its level
-                    self.__pop_stack_until_match(level_stack, header_size, child)
-                    self.__push_to_stack(child, level_stack, structured)
+                    self.__pop_stack_until_match(tree, level_stack, header_size, element)
+                    tree = self.__push_to_stack(element, tree, level_stack, structured)
         
             else:
                 # no header found, add paragraph as a content block to previous node
                 # - content is on same level as its corresponding header
                 element.label = ''
-                content_node = Section(element, level=len(level_stack))
+                if paragraph is not None and paragraph.spans[-1].block is element.block:
+                    paragraph.append(element)
+                    continue
+                if self.coalesce:
+                    paragraph = element = ParagraphElement(element)
                 if level_stack:
-                    level_stack[-1].append_children(content_node)
+                    tree.add(element, len(level_stack), level_stack[-1])
                 else:
                     # if last block in output structure has also no header, merge
-                    if structured and isinstance(structured[-1], DanglingTextSection):
-                        structured[-1].append_children(content_node)
+                    if structured and isinstance(structured[-1], DanglingTreeSection):
+                        tree.add(element, len(level_stack), structured[-1].node)
                     else:
                         # # add dangling content as section
-                        dangling_content = DanglingTextSection()
-                        dangling_content.append_children(content_node)
-                        dangling_content.set_level(len(level_stack))
-                        structured.append(dangling_content)
-            all_elements.append(element)
-        return structured #, all_elements
-
-    def __pop_stack_until_match(self, stack, headerSize, header):
+                        tree = SectionTree()
+                        dangling_content = tree.add(None, len(level_stack))
+                        tree.add(element, len(level_stack), dangling_content)
+                        structured.append(tree.section(dangling_content))
+            # only the last top level section can still receive children
+            while len(structured) > 1:
+                yield structured.pop(0)
+        if labels is not None:
+            source.store_header_labels(rules, labels)
+        if stats is not None and self.rule_stats is not None:
+            self.rule_stats.merge(stats)
+        yield from structured
+
+    def __pop_stack_until_match(self, tree, stack, headerSize, header):
         # if top level is smaller than current header to test, pop it
         # repeat until top level is bigger or same
 
-        while self.__top_has_no_header(stack) or self.__should_pop_higher_level(stack, header):
+        while self.__top_has_no_header(tree, stack) or self.__should_pop_higher_level(tree, stack, header):
             poped = stack.pop()
             # header on higher level in stack has sime FontSize
             # -> check additional sub-header conditions like regexes, enumeration etc.
-            if poped.span_styles['font_stats']['size'] == headerSize:
+            if tree.elements[poped].span_styles['font_stats']['size_q'] == headerSize:
                 # check if header_to_check is sub-header of poped element within stack
-                if self._isSubHeader.test(poped, header):
+                if self._isSubHeader.test(tree.elements[poped], header):
                     stack.append(poped)
                     return
 
     @staticmethod
-    def __push_to_stack(child, stack, output):
+    def __push_to_stack(child, tree: SectionTree, stack, output) -> SectionTree:
         """
         insert incoming paragraph (child) in level(hierarchy) stack.
         @param child: next incoming paragraph
-        @param stack: hierarchy-detect helper stack
+        @param tree: SectionTree of the open top level section
+        @param stack: hierarchy-detect helper stack, nodes of @tree
         @param output: exporting list of elements (contains complete structure in the end)
-        @return:
+        @return: SectionTree @child was added to, a new one if it is a top level section
         """
         if stack:
-            child.set_level(len(stack))
-            stack[-1].children.append(child)
+            node = tree.add(child, len(stack), stack[-1])
         else:
             # append as highest order element
-            output.append(child)
-        stack.append(child)
+            tree = SectionTree()
+            node = tree.add(child)
+            output.append(tree.section(node))
+        stack.append(node)
+        return tree
 
     @staticmethod
-    def __should_pop_higher_level(stack: [Section], header_to_test: Section):
+    def __should_pop_higher_level(tree: SectionTree, stack, header_to_test):
         """
         helper method for __pop_stack_until_match: check if last element in stack is smaller then new header-paragraph.
         @type header_to_test: object
@@ -144,10 +254,11 @@ class HierarchyParser:
         """
         if not stack:
             return False
-        return stack[-1].span_styles['font_stats']['size'] <= header_to_test.span_styles['font_stats']['size']
+        return tree.elements[stack[-1]].span_styles['font_stats']['size_q'] <= \
+            header_to_test.span_styles['font_stats']['size_q']
 
     @staticmethod
-    def __top_has_no_header(stack: [Section]):
+    def __top_has_no_header(tree: SectionTree, stack):
         """
         helper method for @__pop_stack_until_match
         @param stack:
@@ -155,6 +266,76 @@ class HierarchyParser:
         """
         if not stack:
             return False
-        return len(stack[-1].text) == 0
+        return len(tree.elements[stack[-1]].text) == 0
+
+
+# marks the end of the section generator, next() would raise StopIteration inside the executor
+_DONE = object()
 
 
+class AsyncHierarchyParser:
+    """
+    asyncio front end of a HierarchyParser.
+    extraction (Source construction) and rule evaluation run in an executor and do not block the event loop,
+    the number of documents processed at the same time is bounded by @max_documents.
+    the executor steps the section generator of a document, which cannot be sent to another process: only thread
+    executors are supported, use pdfstructure.runner.CorpusRunner to parse with processes.
+    """
+
+    def __init__(self, parser: HierarchyParser, max_documents=4, executor=None):
+        """
+        @param parser: HierarchyParser doing the work
+        @param max_documents: maximum number of documents in flight
+        @param executor: concurrent.futures.ThreadPoolExecutor, None uses the event loop's default (thread pool)
+                         executor
+        """
+        if executor is not None and not isinstance(executor, ThreadPoolExecutor):
+            raise TypeError("AsyncHierarchyParser needs a ThreadPoolExecutor, got {}".format(type(executor).__name__))
+        self.parser = parser
+        self.executor = executor
+        self._semaphore = asyncio.Semaphore(max_documents)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    @asynccontextmanager
+    async def _load(self, source: Union[Source, Callable[[], Source]]) -> AsyncGenerator[Source, None]:
+        # a factory (e.g. functools.partial(FileSource, path)) moves the extraction into the executor as well,
+        # the sources it builds are closed once the document is done
+        if isinstance(source, Source):
+            yield source
+            return
+        source = await self._run(source)
+        try:
+            yield source
+        finally:
+            await self._run(source.close)
+
+    async def _iter_sections(self, source: Source, stats: RuleStats = None,
+                             memo: RuleMemo = None) -> AsyncGenerator[Section, None]:
+        sections = self.parser.iter_sections(source, stats, memo)
+        while True:
+            section = await self._run(next, sections, _DONE)
+            if section is _DONE:
+                return
+            yield section
+
+    async def iter_sections(self, source: Union[Source, Callable[[], Source]]) -> AsyncGenerator[Section, None]:
+        """
+        yields top level sections of a document as soon as they are complete.
+        @param source: Source or callable returning one
+        """
+        async with self._semaphore, self._load(source) as source:
+            async for section in self._iter_sections(source):
+                yield section
+
+    async def structure_document(self, source: Union[Source, Callable[[], Source]]) -> StructuredPdfDocument:
+        """
+        async variant of HierarchyParser.structure_document.
+        @param source: Source or callable returning one
+        """
+        stats, memo = self.parser.document_state()
+        async with self._semaphore, self._load(source) as source:
+            elements = [section async for section in self._iter_sections(source, stats, memo)]
+            font_info = await self._run(lambda: source.font_info)
+        return self.parser.wrap_document(source.uri, elements, font_info, stats, memo)
@@ -0,0 +1,46 @@
+"""
+bounded memo of header verdicts within a document: disclaimers, footers and repeated section labels are classified
+once and every further occurrence with the same text, style and geometry reuses the verdict.
+the key of a span is built by the DetectHeader class (DetectHeaderBase.memo_key), it has to contain everything
+its rules read.
+"""
+from collections import OrderedDict
+
+DEFAULT_MEMO_SIZE = 4096
+
+
+class RuleMemo:
+    """
+    least recently used verdicts of up to @max_size keys, with hit / miss counters.
+    """
+
+    def __init__(self, max_size=DEFAULT_MEMO_SIZE):
+        self.max_size = max_size
+        self.verdicts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        verdict stored for @key, None (counted as miss) if there is none.
+        """
+        verdict = self.verdicts.get(key)
+        if verdict is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.verdicts.move_to_end(key)
+        return verdict
+
+    def put(self, key, verdict: bool):
+        self.verdicts[key] = verdict
+        if len(self.verdicts) > self.max_size:
+            self.verdicts.popitem(last=False)
+
+    def __len__(self):
+        return len(self.verdicts)
+
+    def to_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.verdicts),
+                'hit_rate': self.hits / lookups if lookups else None}
@@ -0,0 +1,99 @@
+"""
+instrumentation of the header rule pipeline (opt-in, see HierarchyParser(instrument=True)): time spent per rule,
+how often each rule passes or fails and which rule was the deciding rejection of a span.
+"""
+from collections import Counter
+
+
+class RuleStats:
+    """
+    counters per rule label. members of OR groups are counted as 'group/member', the group row contains the
+    time of its members.
+    """
+
+    def __init__(self):
+        self.spans = 0
+        self.headers = 0
+        self.time = Counter()       # label -> seconds
+        self.passed = Counter()     # label -> evaluations that passed
+        self.failed = Counter()     # label -> evaluations that failed
+        self.rejected = Counter()   # label -> spans the rule was the first failing must have for
+
+    def record(self, label, passed: bool, seconds: float):
+        self.time[label] += seconds
+        if passed:
+            self.passed[label] += 1
+        else:
+            self.failed[label] += 1
+
+    def record_span(self, is_header: bool, rejected_by=None):
+        self.spans += 1
+        self.headers += is_header
+        if rejected_by is not None:
+            self.rejected[rejected_by] += 1
+
+    def merge(self, other: 'RuleStats') -> 'RuleStats':
+        """
+        add the counters of @other, e.g. to aggregate the stats of a batch of documents.
+        """
+        self.spans += other.spans
+        self.headers += other.headers
+        self.time.update(other.time)
+        self.passed.update(other.passed)
+        self.failed.update(other.failed)
+        self.rejected.update(other.rejected)
+        return self
+
+    @property
+    def labels(self):
+        labels = set(self.time) | set(self.passed) | set(self.failed) | set(self.rejected)
+        # most expensive first
+        return sorted(labels, key=lambda label: -self.time[label])
+
+    def to_dict(self) -> dict:
+        """
+        JSON serializable report.
+        @return: {'spans', 'headers', 'rules': {label: {'calls', 'passed', 'failed', 'pass_rate', 'rejected',
+                  'time', 'us_per_call'}}}
+        """
+        rules = {}
+        for label in self.labels:
+            calls = self.passed[label] + self.failed[label]
+            rules[label] = {'calls': calls,
+                            'passed': self.passed[label],
+                            'failed': self.failed[label],
+                            'pass_rate': self.passed[label] / calls if calls else None,
+                            'rejected': self.rejected[label],
+                            'time': self.time[label],
+                            'us_per_call': self.time[label] * 1e6 / calls if calls else None}
+        return {'spans': self.spans, 'headers': self.headers, 'rules': rules}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RuleStats':
+        """
+        inverse of @to_dict, e.g. for reports read back from JSON lines.
+        """
+        stats = cls()
+        stats.spans = data['spans']
+        stats.headers = data['headers']
+        for label, rule in data['rules'].items():
+            stats.time[label] = rule['time']
+            stats.passed[label] = rule['passed']
+            stats.failed[label] = rule['failed']
+            stats.rejected[label] = rule['rejected']
+        return stats
+
+    def format(self) -> str:
+        """
+        report as text table, most expensive rule first.
+        """
+        lines = ["{} spans, {} headers".format(self.spans, self.headers),
+                 "{:28s} {:>8s} {:>9s} {:>9s} {:>9s} {:>10s}".format(
+                     "rule", "calls", "pass", "rejected", "time ms", "us/call")]
+        for label, rule in self.to_dict()['rules'].items():
+            lines.append("{:28s} {:8d} {:>9s} {:9d} {:9.1f} {:>10s}".format(
+                label, rule['calls'],
+                "{:.2f}".format(rule['pass_rate']) if rule['pass_rate'] is not None else "-",
+                rule['rejected'], rule['time'] * 1e3,
+                "{:.2f}".format(rule['us_per_call']) if rule['us_per_call'] is not None else "-"))
+        return "\n".join(lines)
@@ -1,8 +1,10 @@
 import sys
 from collections import deque
-from typing import Generator
+from typing import Generator, Iterable
 
-from pdfstructure.model.document import StructuredPdfDocument, Section
+from pdfstructure.analysis.geometry import span_geometry
+from pdfstructure.model.document import StructuredPdfDocument, Section, ParagraphElement
+from pdfstructure.model.sectiontree import TreeSection
 
 
 def get_document_depth(document: StructuredPdfDocument):
@@ -42,15 +44,28 @@ def traverse_in_order(document: StructuredPdfDocument) \
     - [5,1,a,b,c,2,10,3,x]
     """
 
+    yield from traverse_sections(document.elements)
+
+
+def traverse_sections(sections: Iterable[Section]) -> Generator[Section, None, None]:
+    """
+    traverse_in_order over top level sections as they come, e.g. from HierarchyParser.iter_sections, a section is
+    traversed as soon as it is yielded.
+    """
+
     def __traverse__(section: Section):
         child: Section
         for child in section.children:
             yield child
             yield from __traverse__(child)
 
-    for element in document.elements:
+    for element in sections:
         # yield element
-        yield from __traverse__(element)
+        if isinstance(element, TreeSection):
+            # walks the index arrays of the SectionTree, sections are created one by one
+            yield from element.descendants()
+        else:
+            yield from __traverse__(element)
 
 
 def traverse_level_order(document: StructuredPdfDocument, max_depth=sys.maxsize) \
@@ -92,5 +107,9 @@ def get_elements_by_page(document, current_page = 0):
             dic['width'] = e.page_w
             dic['height'] = e.page_h
             dic['page_number'] = e.page_number
-            dic['elements'].append({'style':e.span_styles, 'block':e.block_styles,'text':e.text, 'level':e.level, 'label':e.label})
+            # one entry per span, coalesced paragraphs are highlighted and labelled span by span
+            spans = e.element.spans if isinstance(e.element, ParagraphElement) else [e.element]
+            for span in spans:
+                dic['elements'].append({'style':span.span_styles, 'block':span.block_styles,'text':span.text, 'level':e.level, 'label':e.label,
+                                        'geometry': span_geometry(span)._asdict()})
     return dic
\ No newline at end of file
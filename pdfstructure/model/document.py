@@ -5,21 +5,73 @@ from pdfstructure.model.style import Style
 from mu_helper import block_font_info
 
 
+class PageInfo:
+    """
+    geometry of a page as recorded in the page table of a SpanTable (width, height, bbox, rotation).
+    replaces the fitz.Page formerly held by every element, so the document can be closed after extraction.
+    """
+    __slots__ = ('number', 'width', 'height', 'bbox', 'rotation')
+
+    def __init__(self, number: int, width: float, height: float, bbox: tuple, rotation: int = 0):
+        self.number = number
+        self.width = width
+        self.height = height
+        self.bbox = bbox
+        self.rotation = rotation
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        @param row: row of SpanTable.pages
+        """
+        return cls(int(row['number']), float(row['width']), float(row['height']), tuple(row['bbox'].tolist()),
+                   int(row['rotation']))
+
+
 class Element:
     """
-    class representing an element with page,block, line, span information.
+    class representing a block with page, block and line information.
+    shared by all SpanElements of the block and not modified after construction.
     """
 
     def __init__(
-            self, page_number: int, original_block, original_page):
+            self, page_number: int, original_block, page_info: PageInfo, block_info=None, span_table=None,
+            block_index=None):
+        """
+        @param original_block: PyMuPDF block dict, None if the block is read from @span_table
+        @param page_info: geometry of the block's page
+        @param block_info: precomputed (block_styles, line_styles), see mu_helper.block_font_info
+        @param span_table: backing SpanTable of the block's spans
+        @param block_index: row of the block in @span_table
+        """
         self.page_number = page_number 
-        self.block_number = original_block.get('number')
-        self.type = original_block.get('type')
-        self.lines = original_block.get('lines')
-        self.block_styles, self.line_styles = block_font_info(original_block)
-        self.page_info = original_page
-        self.page_info.bbox = tuple(original_page.rect)
-        self.span_styles = {}
+        self.span_table = span_table
+        self.block_index = block_index
+        if original_block is not None:
+            self.block_number = original_block.get('number')
+            self.type = original_block.get('type')
+            self._lines = original_block.get('lines')
+            self.block_styles, self._line_styles = block_info if block_info else block_font_info(original_block)
+        else:
+            # lines and line styles are materialized from the table on access only
+            self.block_number = int(span_table.blocks['number'][block_index])
+            self.type = 0
+            self._lines = None
+            self._line_styles = None
+            self.block_styles = span_table.block_styles(block_index)
+        self.page_info = page_info
+
+    @property
+    def lines(self):
+        if self._lines is not None:
+            return self._lines
+        return self.span_table.block_dict(self.block_index)['lines']
+
+    @property
+    def line_styles(self):
+        if self._line_styles is not None:
+            return self._line_styles
+        return self.span_table.line_styles(self.block_index)
 
     @property
     def block_text(self):
@@ -34,6 +86,141 @@ class Element:
         return _span
 
 
+class SpanElement:
+    """
+    one text span as yielded by a Source: span text and style plus a reference to its (shared) block Element.
+    block attributes (page_number, block_styles, lines, ...) are read through from the block.
+    """
+    __slots__ = ('block', 'span_index', 'text', 'span_styles', 'label', 'page_w', 'page_h', 'text_features',
+                 'geometry')
+
+    def __init__(self, block: Element, span_index, text, span_styles):
+        self.block = block
+        self.span_index = span_index
+        self.text = text
+        self.span_styles = span_styles
+        self.label = None
+        self.page_w = None
+        self.page_h = None
+        # header rule features, see pdfstructure.analysis.textfeatures and pdfstructure.analysis.geometry
+        self.text_features = None
+        self.geometry = None
+
+    @property
+    def page_number(self):
+        return self.block.page_number
+
+    @property
+    def block_number(self):
+        return self.block.block_number
+
+    @property
+    def type(self):
+        return self.block.type
+
+    @property
+    def lines(self):
+        return self.block.lines
+
+    @property
+    def block_styles(self):
+        return self.block.block_styles
+
+    @property
+    def line_styles(self):
+        return self.block.line_styles
+
+    @property
+    def page_info(self):
+        return self.block.page_info
+
+    @property
+    def span_table(self):
+        return self.block.span_table
+
+    @property
+    def block_text(self):
+        return self.block.block_text
+
+    @property
+    def line_index(self):
+        """ row of the span's line in its SpanTable, None without table"""
+        table = self.block.span_table
+        return int(table.spans['line'][self.span_index]) if table is not None else None
+
+
+class ParagraphElement:
+    """
+    consecutive content spans of one block merged into a single element, see HierarchyParser(coalesce=True).
+    text is the span texts in order, spans of different lines separated by a space. offsets[i] is the start of
+    spans[i] within text, @span_pieces maps a range of text back to the spans (e.g. to highlight it).
+    a paragraph is not a row of its SpanTable: span_table is None, span_styles is the style of the first span with
+    the bbox around all spans, so rule features (text_features, geometry) are computed for the paragraph itself.
+    other attributes (span_index, page_number, block_styles, ...) are read from the first span.
+    """
+    __slots__ = ('spans', 'offsets', 'label', 'text_features', 'geometry', '_parts', '_length', '_text', '_styles')
+
+    def __init__(self, span: SpanElement):
+        self.spans = [span]
+        self.offsets = [0]
+        self.label = span.label
+        # header rule features of the paragraph, see pdfstructure.analysis.textfeatures / geometry
+        self.text_features = None
+        self.geometry = None
+        self._parts = [span.text]
+        self._length = len(span.text)
+        self._text = None
+        self._styles = None
+
+    def __getattr__(self, name):
+        if name in ParagraphElement.__slots__:
+            raise AttributeError(name)
+        return getattr(self.spans[0], name)
+
+    def append(self, span: SpanElement):
+        if self._length and not self._parts[-1][-1:].isspace() and span.line_index != self.spans[-1].line_index:
+            self._parts.append(" ")
+            self._length += 1
+        self.spans.append(span)
+        self.offsets.append(self._length)
+        self._parts.append(span.text)
+        self._length += len(span.text)
+        self._text = None
+        self._styles = None
+        self.text_features = None
+        self.geometry = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = "".join(self._parts)
+        return self._text
+
+    @property
+    def span_table(self):
+        return None
+
+    @property
+    def span_styles(self):
+        if self._styles is None:
+            boxes = [span.span_styles['bbox'] for span in self.spans]
+            bbox = (min(box[0] for box in boxes), min(box[1] for box in boxes),
+                    max(box[2] for box in boxes), max(box[3] for box in boxes))
+            self._styles = dict(self.spans[0].span_styles, bbox=bbox)
+        return self._styles
+
+    def span_pieces(self, start=0, end=None) -> List[tuple]:
+        """
+        spans covering text[start:end].
+        @return: [(span, start, end)] with start / end relative to span.text
+        """
+        end = self._length if end is None else end
+        pieces = []
+        for span, offset in zip(self.spans, self.offsets):
+            stop = offset + len(span.text)
+            if offset < end and stop > start:
+                pieces.append((span, max(start, offset) - offset, min(end, stop) - offset))
+        return pieces
 
 
 class TextElement:
@@ -75,22 +262,23 @@ class Section:
     """
     Represents a section with title, contents and children
     """
-    #heading: Element
+    __slots__ = ('element', 'children', 'level')
 
     def __init__(self, element, level=0):
-
-        if element is not None:
-            try:
-                element.__dict__.pop('structured_text_element')
-            except:
-                pass
-            self.__dict__.update(element.__dict__)
-            
-        
+        # wrapped SpanElement, its attributes (text, span_styles, page_number, ...) are read through
+        self.element = element
         self.children = []  # Section
         self.level = None
         self.set_level(level)
 
+    def __getattr__(self, name):
+        if name in Section.__slots__:
+            raise AttributeError(name)
+        element = self.element
+        if element is None:
+            raise AttributeError(name)
+        return getattr(element, name)
+
     def set_level(self, level):
         self.level = level
 
@@ -163,6 +351,8 @@ class Section:
 
 
 class DanglingTextSection(Section):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(element=None)
 
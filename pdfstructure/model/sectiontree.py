@@ -0,0 +1,223 @@
+from array import array
+from collections.abc import Sequence
+from functools import partial
+from typing import Generator, Iterable, List
+
+from pdfstructure.model.document import Section, DanglingTextSection
+
+# no parent / child / sibling
+NO_NODE = -1
+
+
+class SectionTree:
+    """
+    section hierarchy as index arrays instead of nested Section objects, one node per span plus a root without
+    element for dangling text. links, level and span row are typed arrays (array.array, they grow while parsing),
+    the node's SpanElement is kept in @elements. Section objects (TreeSection) are created on access only.
+    parent, first_child, last_child, next_sibling: node indices, NO_NODE if there is none
+    level: Section.level of the node
+    span: row of the node's span in its SpanTable (SpanElement.span_index), NO_NODE for the dangling root
+    ordered: node indices are in pre order, true as long as nodes are added below the last node or one of its
+             parents (like the HierarchyParser does), a subtree is then a range of nodes
+    """
+    __slots__ = ('elements', 'parent', 'first_child', 'last_child', 'next_sibling', 'level', 'span', 'ordered')
+
+    def __init__(self):
+        self.elements = []
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.last_child = array('i')
+        self.next_sibling = array('i')
+        self.level = array('h')
+        self.span = array('i')
+        self.ordered = True
+
+    def __len__(self):
+        return len(self.elements)
+
+    def add(self, element, level=0, parent=NO_NODE) -> int:
+        """
+        append a node as last child of @parent (a root if NO_NODE).
+        @param element: SpanElement of the node, None for a dangling text root
+        @return: index of the new node
+        """
+        node = len(self.elements)
+        if self.ordered and parent != NO_NODE:
+            last = node - 1
+            while last != parent and last != NO_NODE:
+                last = self.parent[last]
+            self.ordered = last == parent
+        self.elements.append(element)
+        self.parent.append(parent)
+        self.first_child.append(NO_NODE)
+        self.last_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+        self.level.append(level)
+        self.span.append(NO_NODE if element is None else element.span_index)
+        if parent != NO_NODE:
+            last = self.last_child[parent]
+            if last == NO_NODE:
+                self.first_child[parent] = node
+            else:
+                self.next_sibling[last] = node
+            self.last_child[parent] = node
+        return node
+
+    def graft(self, section: Section, parent=NO_NODE) -> int:
+        """
+        copy @section and its children (Sections or TreeSections of any tree) as last child of @parent.
+        @return: index of the copied section
+        """
+        node = self.add(section.element, section.level, parent)
+        for child in section.children:
+            self.graft(child, node)
+        return node
+
+    def children(self, node) -> List[int]:
+        children = []
+        child = self.first_child[node]
+        while child != NO_NODE:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def descendants(self, node) -> Iterable[int]:
+        """
+        nodes below @node in order (pre order, like pdfstructure.hierarchy.traversal.traverse_in_order).
+        """
+        if self.ordered:
+            return range(node + 1, self.subtree_end(node))
+        return self._walk(node)
+
+    def _walk(self, node) -> Generator[int, None, None]:
+        first_child, next_sibling, parent = self.first_child, self.next_sibling, self.parent
+        current = first_child[node]
+        while current != NO_NODE:
+            yield current
+            if first_child[current] != NO_NODE:
+                current = first_child[current]
+                continue
+            # climb up to the next node not visited yet, stop at @node
+            while current != node and next_sibling[current] == NO_NODE:
+                current = parent[current]
+            if current == node:
+                return
+            current = next_sibling[current]
+
+    def subtree_end(self, node) -> int:
+        """
+        first node after the subtree of @node in pre order, for ordered trees the subtree is range(node, end).
+        """
+        while node != NO_NODE and self.next_sibling[node] == NO_NODE:
+            node = self.parent[node]
+        return len(self.elements) if node == NO_NODE else self.next_sibling[node]
+
+    def section(self, node) -> 'TreeSection':
+        if self.elements[node] is None:
+            return DanglingTreeSection(self, node)
+        return TreeSection(self, node)
+
+    def roots(self) -> List['TreeSection']:
+        return [self.section(node) for node, parent in enumerate(self.parent) if parent == NO_NODE]
+
+    @property
+    def nbytes(self) -> int:
+        """ bytes of the index arrays and element references (the SpanElements themselves are not counted)"""
+        arrays = (self.parent, self.first_child, self.last_child, self.next_sibling, self.level, self.span)
+        return sum(a.itemsize * len(a) for a in arrays) + 8 * len(self.elements)
+
+
+class TreeSection(Section):
+    """
+    Section view of node @node of a SectionTree, attributes of its SpanElement are read through like for Section.
+    children are views created on access, changes (set_level, append_children) are written to the tree.
+    """
+    __slots__ = ('tree', 'node')
+
+    def __init__(self, tree: SectionTree, node: int):
+        self.tree = tree
+        self.node = node
+        self.element = tree.elements[node]
+        self.level = tree.level[node]
+
+    # attributes read for every section by the printers and the viewer, without the __getattr__ fallback
+    @property
+    def text(self):
+        element = self.element
+        if element is None:
+            raise AttributeError('text')
+        return element.text
+
+    @property
+    def heading_text(self):
+        element = self.element
+        return element.text if element is not None else ""
+
+    def __eq__(self, other):
+        return isinstance(other, TreeSection) and self.tree is other.tree and self.node == other.node
+
+    def __hash__(self):
+        return hash((id(self.tree), self.node))
+
+    @property
+    def children(self) -> 'TreeChildren':
+        return TreeChildren(self.tree, self.node)
+
+    def set_level(self, level):
+        self.tree.level[self.node] = level
+        self.level = level
+
+    def append_children(self, section):
+        self.tree.graft(section, self.node)
+
+    def descendants(self) -> Iterable['TreeSection']:
+        """ nested children in order, without building the child lists"""
+        # only roots are dangling
+        tree = self.tree
+        return map(partial(TreeSection, tree), tree.descendants(self.node))
+
+    @property
+    def full_content(self):
+        contents = [self.heading_text] if self.heading_text else []
+        for child in self.descendants():
+            if child.heading_text:
+                contents.append(child.heading_text)
+        return "\n".join(contents)
+
+
+class DanglingTreeSection(TreeSection, DanglingTextSection):
+    """ root of text before the first header, it has no element"""
+    __slots__ = ()
+
+
+class TreeChildren(Sequence):
+    """
+    children of a TreeSection, read only list of TreeSections. testing for children (bool) reads the first_child
+    link only, the child nodes are looked up and their sections created when iterated / indexed.
+    """
+    __slots__ = ('tree', 'node', '_nodes')
+
+    def __init__(self, tree: SectionTree, node: int):
+        self.tree = tree
+        self.node = node
+        self._nodes = None
+
+    @property
+    def nodes(self) -> List[int]:
+        if self._nodes is None:
+            self._nodes = self.tree.children(self.node)
+        return self._nodes
+
+    def __bool__(self):
+        return self.tree.first_child[self.node] != NO_NODE
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [TreeSection(self.tree, node) for node in self.nodes[i]]
+        return TreeSection(self.tree, self.nodes[i])
+
+    def __iter__(self):
+        return map(partial(TreeSection, self.tree), self.nodes)
@@ -0,0 +1,517 @@
+import json
+from collections import Counter
+from typing import Iterable, List
+import numpy as np
+from mu_helper import STATS_CLIP_TOP, STATS_CLIP_BOTTOM, SIZE_QUANTUM, quantize_size, is_bold, is_italic
+
+# one row per text span, sizes and coordinates keep PyMuPDF's float64 values so comparisons stay exact
+SPAN_DTYPE = np.dtype([
+    ('size', 'f8'),
+    ('flags', 'i4'),
+    ('color', 'i4'),
+    ('font', 'i4'),         # index into SpanTable.fonts
+    ('style', 'i4'),        # index into SpanTable.styles
+    ('bbox', 'f8', (4,)),
+    ('origin', 'f8', (2,)),
+    ('page', 'i4'),         # page number
+    ('block', 'i4'),        # row in SpanTable.blocks
+    ('line', 'i4'),         # row in SpanTable.lines
+    ('text_start', 'i8'),   # offsets into SpanTable.text
+    ('text_end', 'i8'),
+])
+
+# distinct (size, flags, font, color) combinations of a document, interned once
+STYLE_DTYPE = np.dtype([
+    ('size_q', 'i4'),       # mu_helper.quantize_size
+    ('flags', 'i4'),
+    ('font', 'i4'),
+    ('color', 'i4'),
+])
+
+LINE_DTYPE = np.dtype([
+    ('block', 'i4'),
+    ('bbox', 'f8', (4,)),
+    ('span_start', 'i8'),
+    ('span_stop', 'i8'),
+])
+
+BLOCK_DTYPE = np.dtype([
+    ('page', 'i4'),
+    ('number', 'i4'),       # block number within its page, as reported by PyMuPDF
+    ('bbox', 'f8', (4,)),
+    ('line_start', 'i8'),
+    ('line_stop', 'i8'),
+    ('span_start', 'i8'),
+    ('span_stop', 'i8'),
+])
+
+PAGE_DTYPE = np.dtype([
+    ('number', 'i4'),
+    ('width', 'f8'),
+    ('height', 'f8'),
+    ('bbox', 'f8', (4,)),
+    ('rotation', 'i4'),
+    ('block_start', 'i8'),
+    ('block_stop', 'i8'),
+    ('span_start', 'i8'),
+    ('span_stop', 'i8'),
+])
+
+
+class StyleIndex:
+    """
+    interns font names and styles, shared by the tables of one document (e.g. one table per page)
+    so that their font and style ids agree.
+    """
+
+    def __init__(self):
+        self.fonts = {}
+        self.styles = {}
+
+    def font_id(self, name) -> int:
+        return self.fonts.setdefault(name, len(self.fonts))
+
+    def style_id(self, key) -> int:
+        return self.styles.setdefault(key, len(self.styles))
+
+
+class SpanTable:
+    """
+    columnar store of all text spans of a document.
+    spans, lines, blocks and pages are numpy structured arrays, rows are in reading order and every level
+    references its children by contiguous [start, stop) row ranges. span texts live in one string buffer
+    and font names in a list, both referenced by index.
+    every distinct (size, flags, font, color) combination is interned as a style id, so styles are compared
+    as integers and the style dicts handed to rules are built once per style instead of once per span.
+    """
+
+    def __init__(self, spans: np.ndarray, lines: np.ndarray, blocks: np.ndarray, pages: np.ndarray,
+                 text: str, fonts: List[str], styles: np.ndarray):
+        self.spans = spans
+        self.lines = lines
+        self.blocks = blocks
+        self.pages = pages
+        self.text = text
+        self.fonts = fonts
+        self.styles = styles
+        self._style_info = {}
+        # span geometry, see pdfstructure.analysis.geometry
+        self.geometry = None
+
+    @classmethod
+    def from_pages(cls, pages: Iterable[dict], index: StyleIndex = None):
+        """
+        build table from extracted page dicts (pdfstructure.extraction), pages are consumed one by one.
+        @param index: StyleIndex shared with other tables of the same document, a new one if None
+        """
+        index = index if index is not None else StyleIndex()
+        span_rows, line_rows, block_rows, page_rows, texts = [], [], [], [], []
+        text_pos = 0
+        for page in pages:
+            page_block_start, page_span_start = len(block_rows), len(span_rows)
+            for b in page['blocks']:
+                if b['type'] != 0:
+                    continue
+                block_id = len(block_rows)
+                block_line_start, block_span_start = len(line_rows), len(span_rows)
+                for l in b['lines']:
+                    line_id = len(line_rows)
+                    line_span_start = len(span_rows)
+                    for s in l['spans']:
+                        font_id = index.font_id(s['font'])
+                        style_id = index.style_id((quantize_size(s['size']), s['flags'], font_id, s['color']))
+                        text = s['text']
+                        span_rows.append((s['size'], s['flags'], s['color'], font_id, style_id, s['bbox'], s['origin'],
+                                          page['number'], block_id, line_id, text_pos, text_pos + len(text)))
+                        texts.append(text)
+                        text_pos += len(text)
+                    line_rows.append((block_id, l['bbox'], line_span_start, len(span_rows)))
+                block_rows.append((page['number'], b['number'], b['bbox'], block_line_start, len(line_rows),
+                                   block_span_start, len(span_rows)))
+            page_rows.append((page['number'], page['width'], page['height'], page['bbox'], page['rotation'],
+                              page_block_start, len(block_rows), page_span_start, len(span_rows)))
+
+        return cls(spans=np.array(span_rows, dtype=SPAN_DTYPE),
+                   lines=np.array(line_rows, dtype=LINE_DTYPE),
+                   blocks=np.array(block_rows, dtype=BLOCK_DTYPE),
+                   pages=np.array(page_rows, dtype=PAGE_DTYPE),
+                   text="".join(texts),
+                   fonts=list(index.fonts),
+                   styles=np.array(list(index.styles), dtype=STYLE_DTYPE))
+
+    @classmethod
+    def concat(cls, tables: List['SpanTable'], index: StyleIndex = None):
+        """
+        merge tables (e.g. of consecutive page ranges) in the given order, font and style ids are re-mapped.
+        @param index: StyleIndex to intern into, ids stay unchanged for tables built with the same index
+        """
+        index = index if index is not None else StyleIndex()
+        spans, lines, blocks, pages, texts = [], [], [], [], []
+        n_spans = n_lines = n_blocks = n_text = 0
+        for table in tables:
+            font_map = np.array([index.font_id(name) for name in table.fonts], dtype='i4')
+            style_map = np.array([index.style_id((size_q, flags, int(font_map[font]), color))
+                                  for size_q, flags, font, color in table.styles.tolist()], dtype='i4')
+            s = table.spans.copy()
+            if len(s):
+                s['font'] = font_map[s['font']]
+                s['style'] = style_map[s['style']]
+            s['block'] += n_blocks
+            s['line'] += n_lines
+            s['text_start'] += n_text
+            s['text_end'] += n_text
+            l = table.lines.copy()
+            l['block'] += n_blocks
+            l['span_start'] += n_spans
+            l['span_stop'] += n_spans
+            b = table.blocks.copy()
+            b['line_start'] += n_lines
+            b['line_stop'] += n_lines
+            b['span_start'] += n_spans
+            b['span_stop'] += n_spans
+            p = table.pages.copy()
+            p['block_start'] += n_blocks
+            p['block_stop'] += n_blocks
+            p['span_start'] += n_spans
+            p['span_stop'] += n_spans
+            spans.append(s)
+            lines.append(l)
+            blocks.append(b)
+            pages.append(p)
+            texts.append(table.text)
+            n_spans += len(s)
+            n_lines += len(l)
+            n_blocks += len(b)
+            n_text += len(table.text)
+
+        return cls(spans=np.concatenate(spans) if spans else np.empty(0, SPAN_DTYPE),
+                   lines=np.concatenate(lines) if lines else np.empty(0, LINE_DTYPE),
+                   blocks=np.concatenate(blocks) if blocks else np.empty(0, BLOCK_DTYPE),
+                   pages=np.concatenate(pages) if pages else np.empty(0, PAGE_DTYPE),
+                   text="".join(texts),
+                   fonts=list(index.fonts),
+                   styles=np.array(list(index.styles), dtype=STYLE_DTYPE))
+
+    def page_table(self, number) -> 'SpanTable':
+        """
+        table of the single page @number with offsets starting at 0, as if only this page had been extracted.
+        fonts and styles are shared with this table.
+        """
+        page = self.page_rows(number).copy()
+        block_start, block_stop = int(page['block_start'][0]), int(page['block_stop'][0])
+        span_start, span_stop = int(page['span_start'][0]), int(page['span_stop'][0])
+        blocks = self.blocks[block_start:block_stop].copy()
+        line_start = int(blocks['line_start'][0]) if len(blocks) else 0
+        line_stop = int(blocks['line_stop'][-1]) if len(blocks) else 0
+        lines = self.lines[line_start:line_stop].copy()
+        spans = self.spans[span_start:span_stop].copy()
+        text_start = int(spans['text_start'][0]) if len(spans) else 0
+        text_stop = int(spans['text_end'][-1]) if len(spans) else 0
+
+        spans['block'] -= block_start
+        spans['line'] -= line_start
+        spans['text_start'] -= text_start
+        spans['text_end'] -= text_start
+        lines['block'] -= block_start
+        lines['span_start'] -= span_start
+        lines['span_stop'] -= span_start
+        blocks['line_start'] -= line_start
+        blocks['line_stop'] -= line_start
+        blocks['span_start'] -= span_start
+        blocks['span_stop'] -= span_start
+        page['block_start'] -= block_start
+        page['block_stop'] -= block_start
+        page['span_start'] -= span_start
+        page['span_stop'] -= span_start
+        return SpanTable(spans=spans, lines=lines, blocks=blocks, pages=page, text=self.text[text_start:text_stop],
+                         fonts=self.fonts, styles=self.styles)
+
+    def arrays(self) -> dict:
+        """
+        table as dict of numpy arrays, no python objects: text and font names are stored as utf-8 bytes.
+        """
+        return {'spans': self.spans, 'lines': self.lines, 'blocks': self.blocks, 'pages': self.pages,
+                'styles': self.styles,
+                'text': np.frombuffer(self.text.encode('utf-8'), dtype='u1'),
+                'fonts': np.frombuffer(json.dumps(self.fonts).encode('utf-8'), dtype='u1')}
+
+    @classmethod
+    def from_arrays(cls, data):
+        """
+        table from @arrays (or an npz archive holding them).
+        """
+        return cls(spans=data['spans'], lines=data['lines'], blocks=data['blocks'], pages=data['pages'],
+                   text=data['text'].tobytes().decode('utf-8'),
+                   fonts=json.loads(data['fonts'].tobytes().decode('utf-8')),
+                   styles=data['styles'])
+
+    def save(self, fp, compressed=True):
+        """
+        write table as npz archive, see @arrays.
+        @param fp: path or binary file object
+        """
+        save = np.savez_compressed if compressed else np.savez
+        save(fp, **self.arrays())
+
+    @classmethod
+    def load(cls, fp):
+        """
+        read table written by @save.
+        """
+        with np.load(fp, allow_pickle=False) as data:
+            return cls.from_arrays(data)
+
+    def __len__(self):
+        return len(self.spans)
+
+    @property
+    def nbytes(self):
+        """approximate memory held by the table"""
+        return self.spans.nbytes + self.lines.nbytes + self.blocks.nbytes + self.pages.nbytes + self.styles.nbytes + \
+            len(self.text.encode('utf-8')) + sum(len(f) for f in self.fonts)
+
+    def span_text(self, i) -> str:
+        row = self.spans[i]
+        return self.text[row['text_start']:row['text_end']]
+
+    def span_font(self, i) -> str:
+        return self.fonts[self.spans['font'][i]]
+
+    def span_dict(self, i) -> dict:
+        """
+        span row i in the shape of a PyMuPDF span dict (size, flags, font, color, bbox, origin, text).
+        """
+        row = self.spans[i]
+        return {'size': float(row['size']),
+                'flags': int(row['flags']),
+                'font': self.fonts[row['font']],
+                'color': int(row['color']),
+                'bbox': tuple(row['bbox'].tolist()),
+                'origin': tuple(row['origin'].tolist()),
+                'text': self.text[row['text_start']:row['text_end']],
+                }
+
+    def style_info(self, style_id) -> dict:
+        """
+        style dicts of an interned style, built once per style and shared by all its spans.
+        @return: {'identifier', 'styles', 'font_stats'}, font_stats['size'] is the quantized size
+        """
+        info = self._style_info.get(style_id)
+        if info is None:
+            size_q, flags, font_id, color = self.styles[style_id].tolist()
+            size = size_q / SIZE_QUANTUM
+            font = self.fonts[font_id]
+            identifier = "{0}_{1}_{2}_{3}".format(round(size, 0), flags, font, color)
+            info = {'identifier': identifier,
+                    'styles': {identifier: {'size': round(size, 0), 'flags': flags, 'font': font, 'color': color,
+                                            'italic': is_italic(flags), 'bold': is_bold(flags)}},
+                    'font_stats': {'size': size, 'size_q': size_q, 'flags': flags, 'font': font, 'font_id': font_id,
+                                   'color': color, 'italic': is_italic(flags), 'bold': is_bold(flags),
+                                   'style_id': style_id},
+                    }
+            self._style_info[style_id] = info
+        return info
+
+    def span_styles(self, i) -> dict:
+        """
+        span style info of row i: font_counts (empty), styles, font_stats, bbox and style_id.
+        """
+        row = self.spans[i]
+        style_id = int(row['style'])
+        info = self.style_info(style_id)
+        return {'font_counts': [],
+                'styles': info['styles'],
+                'font_stats': info['font_stats'],
+                'bbox': tuple(row['bbox'].tolist()),
+                'style_id': style_id,
+                }
+
+    def block_font_info(self, b):
+        """
+        block style info of block row b, same result shape as mu_helper.block_font_info.
+        """
+        return self.block_styles(b), self.line_styles(b)
+
+    def block_styles(self, b) -> dict:
+        """
+        block styles of block row b, first part of @block_font_info.
+        """
+        block = self.blocks[b]
+        spans = self.spans[block['span_start']:block['span_stop']]
+        style_ids = spans['style'].tolist()
+        sizes = spans['size'].tolist()
+        fonts = spans['font'].tolist()
+        colors = spans['color'].tolist()
+        if not style_ids:
+            raise ValueError("Zero discriminating fonts found!")
+
+        styles = {}
+        font_counts = {}
+        for style_id in style_ids:
+            info = self.style_info(style_id)
+            identifier = info['identifier']
+            if identifier not in styles:
+                style = info['styles'][identifier]
+                styles[identifier] = {'size': style['size'], 'flags': style['flags'], 'font': style['font'],
+                                      'color': style['color']}
+            font_counts[identifier] = font_counts.get(identifier, 0) + 1
+        font_counts = sorted(font_counts.items(), key=lambda item: item[1], reverse=True)
+        for identifier, v in font_counts:
+            styles[identifier]['count'] = v
+
+        common_size = Counter(sizes).most_common(1)[0][0]
+        common_font_id = Counter(fonts).most_common(1)[0][0]
+        common_color = Counter(colors).most_common(1)[0][0]
+        # style bits of the first span set in the most common font
+        common_flags = self.styles['flags'][style_ids[fonts.index(common_font_id)]]
+        common_font = self.fonts[common_font_id]
+
+        font_stats = {
+            'bold': is_bold(common_flags),
+            'italic': is_italic(common_flags),
+            "font_name": common_font,
+            'max_font': max(sizes),
+            'min_font': min(sizes),
+            'common_color': common_color,
+            'common_font': common_font,
+            'common_size': common_size,
+        }
+
+        return {'font_counts': font_counts, 'styles': styles, 'font_stats': font_stats,
+                'bbox': tuple(block['bbox'].tolist())}
+
+    def line_styles(self, b) -> dict:
+        """
+        per line text and styles of block row b, second part of @block_font_info.
+        """
+        block = self.blocks[b]
+        lines_info = {}
+        for i, l in enumerate(range(block['line_start'], block['line_stop'])):
+            line = self.lines[l]
+            lines_info[i] = {'text': "", 'style': []}
+            for j in range(line['span_start'], line['span_stop']):
+                row = self.spans[j]
+                lines_info[i]['text'] += self.text[row['text_start']:row['text_end']]
+                lines_info[i]['style'].append((round(float(row['size'])), self.fonts[row['font']], int(row['color'])))
+                lines_info[i]['unique_font'] = len(lines_info[i]['style']) == 1
+            lines_info[i]['bbox'] = tuple(line['bbox'].tolist())
+        return lines_info
+
+    def block_dict(self, b) -> dict:
+        """
+        block row b in the shape of a PyMuPDF text block dict, e.g. for mu_helper.block_font_info.
+        """
+        block = self.blocks[b]
+        lines = []
+        for l in range(block['line_start'], block['line_stop']):
+            line = self.lines[l]
+            lines.append({'bbox': tuple(line['bbox'].tolist()),
+                          'spans': [self.span_dict(i) for i in range(line['span_start'], line['span_stop'])]})
+        return {'number': int(block['number']),
+                'type': 0,
+                'bbox': tuple(block['bbox'].tolist()),
+                'lines': lines,
+                }
+
+    def page_rows(self, number):
+        """row of page @number in self.pages"""
+        return self.pages[self.pages['number'] == number]
+
+    def stats_spans(self) -> np.ndarray:
+        """
+        span rows inside the statistics clip (baseline within the STATS_CLIP_TOP / STATS_CLIP_BOTTOM margins, like
+        get_text(clip=...)), the base of all document statistics.
+        """
+        spans = self.spans
+        counts = self.pages['span_stop'] - self.pages['span_start']
+        heights = np.repeat(self.pages['height'], counts)
+        widths = np.repeat(self.pages['width'], counts)
+        mask = (spans['origin'][:, 1] >= STATS_CLIP_TOP) & (spans['origin'][:, 1] <= heights - STATS_CLIP_BOTTOM) \
+            & (spans['bbox'][:, 2] > 0) & (spans['bbox'][:, 0] < widths)
+        return spans[mask]
+
+    def stats_table(self) -> 'SpanTable':
+        """
+        table of the @stats_spans only (no lines, blocks or text), same font_info as this table.
+        SpanTable.concat of the stats tables of all pages gives the document statistics without keeping the pages.
+        """
+        spans = self.stats_spans()
+        pages = self.pages.copy()
+        counts = np.array([np.count_nonzero((spans['page'] == number)) for number in pages['number'].tolist()],
+                          dtype='i8')
+        pages['span_stop'] = np.cumsum(counts)
+        pages['span_start'] = pages['span_stop'] - counts
+        pages['block_start'] = pages['block_stop'] = 0
+        spans = spans.copy()
+        spans['block'] = spans['line'] = 0
+        spans['text_start'] = spans['text_end'] = 0
+        return SpanTable(spans, self.lines[:0], self.blocks[:0], pages, "", self.fonts, self.styles)
+
+    def font_info(self, granularity=True):
+        """
+        document style statistics over the pages of this table: font_counts, styles, font_stats, bbox, page_w, page_h.
+        """
+        if not len(self.pages):
+            raise ValueError("Zero discriminating fonts found!")
+        s = self.stats_spans()
+        if not len(s):
+            raise ValueError("Zero discriminating fonts found!")
+
+        def most_common(values):
+            # Counter.most_common(1): highest count, ties resolved by first occurrence
+            uniques, first, count = np.unique(values, return_index=True, return_counts=True)
+            candidates = np.flatnonzero(count == count.max())
+            return uniques[candidates[np.argmin(first[candidates])]]
+
+        common_size = float(most_common(s['size']))
+        common_font_id = int(most_common(s['font']))
+        common_font = self.fonts[common_font_id]
+        common_color = int(most_common(s['color']))
+
+        rounded = np.round(s['size'])
+        if granularity:
+            keys = np.empty(len(s), dtype=[('size', 'f8'), ('flags', 'i4'), ('font', 'i4'), ('color', 'i4')])
+            keys['size'], keys['flags'], keys['font'], keys['color'] = rounded, s['flags'], s['font'], s['color']
+        else:
+            keys = rounded
+        uniques, first, inverse, count = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        # last occurrence of every key, styles are described by the latest span
+        last = np.zeros(len(uniques), dtype='i8')
+        last[inverse] = np.arange(len(s))
+
+        styles = {}
+        font_counts = []
+        for u in np.argsort(first, kind='stable'):
+            if granularity:
+                key = uniques[u]
+                size = round(float(key['size']), 0)
+                identifier = "{0}_{1}_{2}_{3}".format(size, int(key['flags']), self.fonts[key['font']],
+                                                      int(key['color']))
+                styles[identifier] = {'size': size, 'flags': int(key['flags']), 'font': self.fonts[key['font']],
+                                      'color': int(key['color'])}
+            else:
+                size = round(float(uniques[u]))
+                identifier = "{0}".format(size)
+                styles[identifier] = {'size': size, 'font': self.fonts[s['font'][last[u]]]}
+            font_counts.append((identifier, int(count[u])))
+        font_counts.sort(key=lambda item: item[1], reverse=True)
+        for identifier, v in font_counts:
+            styles[identifier]['count'] = v
+
+        span_widths = s['bbox'][:, 2] - s['bbox'][:, 0]
+        widest = int(np.argmax(span_widths))
+        bbox = tuple(s['bbox'][widest].tolist()) if span_widths[widest] > 0 else (0, 0, 0, 0)
+
+        font_stats = {
+            'max_font': float(s['size'].max()),
+            'min_font': float(s['size'].min()),
+            'common_color': common_color,
+            'common_font': common_font,
+            'common_size': common_size,
+            'common_size_q': quantize_size(common_size),
+            'common_font_id': common_font_id,
+        }
+
+        return {'font_counts': font_counts, 'styles': styles, 'font_stats': font_stats, 'bbox': bbox,
+                'page_w': float(self.pages['width'][-1]), 'page_h': float(self.pages['height'][-1])}
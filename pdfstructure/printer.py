@@ -1,8 +1,8 @@
 import json
-from typing import Iterator
+from typing import Iterable, Iterator
 
-from pdfstructure.hierarchy.traversal import traverse_in_order
-from pdfstructure.model.document import Section, StructuredPdfDocument, TextElement
+from pdfstructure.hierarchy.traversal import traverse_in_order, traverse_sections
+from pdfstructure.model.document import Section, StructuredPdfDocument, TextElement, SpanElement, ParagraphElement
 from pdfstructure.model.style import Style
 from pdfstructure.utils import dict_subset
 
@@ -71,6 +71,17 @@ class PrettyStringFilePrinter(PrettyStringPrinter):
                 file.write(pretty)
         return output_file
 
+    def print_sections(self, sections: Iterable[Section], file_path) -> str:
+        """
+        same output as @print, written while the top level @sections are generated, e.g. by
+        HierarchyParser.iter_sections(source), without holding the whole document.
+        @return: file_path to outputfile
+        """
+        with open(file_path, "w") as file:
+            for pretty in self.make_item_pretty(traverse_sections(sections)):
+                file.write(pretty)
+        return file_path
+
 
 class ElementTextEncoder(json.JSONEncoder):
     def default(self, e):
@@ -87,10 +98,18 @@ def encode_pdf_element(obj):
     customizse pdf element encoding
     - get rid of detailed pdf information retrieved from pdfminer like bounding box coords
     - use mapped fontsize name instead of ordinal value
+    - sections as heading text, level, page and their children (sections and elements keep their data in slots)
     @param obj:
     @return:
     """
-    if isinstance(obj, TextElement):
+    if isinstance(obj, Section):
+        return {"heading": obj.heading_text, "level": obj.level,
+                "page": getattr(obj.element, "page_number", None), "children": list(obj.children)}
+    elif isinstance(obj, (SpanElement, ParagraphElement)):
+        styles = obj.span_styles
+        return {"text": obj.text, "page": obj.page_number, "label": obj.label, "bbox": list(styles["bbox"]),
+                "font_stats": styles["font_stats"]}
+    elif isinstance(obj, TextElement):
         properties = dict_subset(obj.__dict__.copy(), ("_data", "_text"))
         properties["text"] = obj.text
         properties["style"] = encode_pdf_element(obj.style)
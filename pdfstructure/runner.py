@@ -0,0 +1,247 @@
+"""
+batch processing of a pdf corpus: every document is parsed (FileSource + HierarchyParser) in its own worker
+process and one JSON line per document is streamed to the output, with wall time, page count and peak RSS.
+a document that fails (corrupt pdf, parser error or even a crashed worker) is recorded as error and the batch
+continues.
+
+usage: pdfstructure-batch data/sample_kids -o results.jsonl -w 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from itertools import chain
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Generator, Iterable, List
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+from pdfstructure.cache import SpanCache
+from pdfstructure.hierarchy.classifier import DetectHeaderModel
+from pdfstructure.hierarchy.detectheader import DetectHeaderKID, DetectHeaderKIDStyled
+from pdfstructure.hierarchy.parser import HierarchyParser
+from pdfstructure.hierarchy.rulestats import RuleStats
+from pdfstructure.hierarchy.traversal import traverse_sections
+from pdfstructure.source import FileSource
+from pdfstructure.utils import find_file, DocTypeFilter
+
+# a document whose worker crashed is retried this many times. a crash also takes down the other documents in
+# flight, those are retried one at a time first and only a crash of a document running alone is counted
+MAX_ATTEMPTS = 2
+
+
+def peak_rss_kb():
+    """
+    peak resident set size of this process in kB, None if not available on the platform.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kB on linux
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def collect_files(inputs: Iterable[str]) -> List[str]:
+    """
+    expand directories (recursively) to the pdf files they contain, files are taken as they are.
+    """
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            files.extend(sorted(str(p) for p in find_file(path, DocTypeFilter(endings=("pdf",)), print_mod=0)))
+        else:
+            files.append(path)
+    return files
+
+
+def process_document(file_path: str, header_conditions_cls=DetectHeaderKID, source_kwargs: dict = None,
+                     rule_stats=False, memo_size=0) -> dict:
+    """
+    parse one document and describe the result as a JSON serializable record.
+    exceptions are caught and reported in the record.
+    @param file_path: path to pdf
+    @param header_conditions_cls: header detection class handed to the HierarchyParser
+    @param source_kwargs: keyword arguments of FileSource
+    @param rule_stats: instrument the header rules, adds 'rule_stats' (see RuleStats.to_dict) to the record
+    @param memo_size: reuse verdicts of repeated spans, adds the memo counters as 'rule_memo' to the record
+    @return: {'file', 'ok', 'error', 'pages', 'sections', 'headings', 'wall_time', 'timings', 'peak_rss_kb',
+              'outline': [[level, heading text, page number], ...]}, headings and outline are the spans detected as
+              header, sections the top level sections
+    """
+    start = time.perf_counter()
+    record = {'file': file_path, 'ok': False, 'error': None, 'pages': None, 'sections': None, 'headings': None}
+    try:
+        with FileSource(file_path, **(source_kwargs or {})) as source:
+            parser = HierarchyParser(header_conditions_cls, instrument=rule_stats, memo_size=memo_size)
+            document = parser.structure_document(source)
+            # top level sections and everything below them (traverse_in_order leaves out the top level)
+            sections = (section for top in document.elements for section in chain([top], traverse_sections([top])))
+            outline = [[section.level, section.heading_text.strip(), section.page_number]
+                       for section in sections if getattr(section, 'label', None) == 'heading']
+            record.update(ok=True, pages=len(source.page_numbers), sections=len(document.elements),
+                          headings=len(outline), timings=source.timings, outline=outline)
+            if rule_stats:
+                record['rule_stats'] = document.metadata['rule_stats'].to_dict()
+            if 'rule_memo' in document.metadata:
+                record['rule_memo'] = document.metadata['rule_memo']
+    except Exception as e:
+        record.update(error="{}: {}".format(type(e).__name__, e), traceback=traceback.format_exc())
+    record['wall_time'] = time.perf_counter() - start
+    record['peak_rss_kb'] = peak_rss_kb()
+    return record
+
+
+class CorpusRunner:
+    """
+    runs the parser over a corpus of pdf files with a pool of worker processes.
+    every worker process handles @tasks_per_worker documents before it is replaced, with the default of 1 the
+    reported peak RSS is the one of the document alone and leaked native memory does not add up.
+    """
+
+    def __init__(self, workers: int = None, header_conditions_cls=DetectHeaderKID, source_kwargs: dict = None,
+                 tasks_per_worker: int = 1, rule_stats=False, memo_size=0):
+        """
+        @param workers: number of worker processes, defaults to the number of cpus
+        @param header_conditions_cls: header detection class, see pdfstructure.hierarchy.detectheader
+        @param source_kwargs: keyword arguments of FileSource, e.g. {'sample_pages': 8}
+        @param tasks_per_worker: documents processed by a worker process before it is replaced
+        @param rule_stats: instrument the header rules, per document in the records and aggregated in the summary
+        @param memo_size: verdicts of repeated spans kept per document, see HierarchyParser
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.header_conditions_cls = header_conditions_cls
+        self.source_kwargs = source_kwargs or {}
+        self.tasks_per_worker = tasks_per_worker
+        self.rule_stats = rule_stats
+        self.memo_size = memo_size
+
+    def iter_results(self, inputs: Iterable[str]) -> Generator[dict, None, None]:
+        """
+        yields one record per document (see @process_document) in order of completion.
+        @param inputs: pdf files and / or directories containing pdf files
+        """
+        pending = deque(collect_files(inputs))
+        # documents in flight when a worker crashed, retried one at a time to find the one that crashed
+        suspects = deque()
+        attempts = Counter()
+        while pending or suspects:
+            if suspects:
+                yield from self.run_pool(suspects, 1, suspects, attempts)
+            else:
+                yield from self.run_pool(pending, self.workers, suspects, attempts)
+
+    def run_pool(self, files: deque, workers: int, suspects: deque, attempts: Counter) -> Generator[dict, None, None]:
+        """
+        process @files with a new pool until they are done or a worker crashes. at most @workers documents are
+        submitted at a time, a crash only fails the documents in flight, the others stay in @files.
+        documents in flight at a crash go to @suspects, a document that crashed alone is charged an attempt.
+        """
+        crashed = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(files)), max_tasks_per_child=self.tasks_per_worker) \
+                as pool:
+            running = {}
+            while (files or running) and not crashed:
+                while files and len(running) < workers:
+                    file_path = files.popleft()
+                    running[pool.submit(process_document, file_path, self.header_conditions_cls,
+                                        self.source_kwargs, self.rule_stats, self.memo_size)] = file_path
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path = running.pop(future)
+                    try:
+                        yield future.result()
+                    except BrokenProcessPool:
+                        # a worker died (e.g. segfault in native code), the pool can not be used anymore
+                        crashed.append(file_path)
+            # the documents still in flight fail with the pool, unless they completed before
+            for future in as_completed(running):
+                try:
+                    yield future.result()
+                except BrokenProcessPool:
+                    crashed.append(running[future])
+        for file_path in crashed:
+            if len(crashed) > 1:
+                # any of them may have crashed the worker
+                suspects.append(file_path)
+                continue
+            attempts[file_path] += 1
+            if attempts[file_path] < MAX_ATTEMPTS:
+                suspects.append(file_path)
+            else:
+                yield {'file': file_path, 'ok': False, 'error': 'worker process terminated abruptly',
+                       'pages': None, 'sections': None, 'headings': None, 'wall_time': None,
+                       'peak_rss_kb': None}
+
+    def run(self, inputs: Iterable[str], output_path: str) -> dict:
+        """
+        process the corpus and write one JSON line per document to @output_path as soon as it is done.
+        @return: summary {'documents', 'failed', 'pages', 'wall_time'}, with rule_stats=True also 'rule_stats', the
+                 RuleStats of all documents
+        """
+        start = time.perf_counter()
+        summary = {'documents': 0, 'failed': 0, 'pages': 0}
+        stats = RuleStats()
+        with open(output_path, "w") as fp:
+            for record in self.iter_results(inputs):
+                fp.write(json.dumps(record) + "\n")
+                fp.flush()
+                summary['documents'] += 1
+                summary['failed'] += not record['ok']
+                summary['pages'] += record['pages'] or 0
+                if 'rule_stats' in record:
+                    stats.merge(RuleStats.from_dict(record['rule_stats']))
+        summary['wall_time'] = time.perf_counter() - start
+        if self.rule_stats:
+            summary['rule_stats'] = stats
+        return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="parse a corpus of pdf files into a JSONL file")
+    parser.add_argument("inputs", nargs="+", help="pdf files or directories")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL output file")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes, default: cpu count")
+    parser.add_argument("--tasks-per-worker", type=int, default=1,
+                        help="documents per worker process before it is replaced")
+    parser.add_argument("--sample-pages", type=int, default=None,
+                        help="estimate the document style from this many pages")
+    parser.add_argument("--cache", default=None, help="directory of the on-disk span cache")
+    parser.add_argument("--header-model", action="store_true",
+                        help="detect headers with the trained classifier instead of the KID rules")
+    parser.add_argument("--header-style", action="store_true",
+                        help="KID rules plus a style must have (headers differ from the body text style), "
+                             "spans in the body style are no headers, fewer headers than the KID rules")
+    parser.add_argument("--memo-size", type=int, default=0,
+                        help="reuse the header verdicts of repeated spans, up to this many per document")
+    parser.add_argument("--rule-stats", action="store_true",
+                        help="time the header rules and report pass rates and rejections per rule")
+    args = parser.parse_args(argv)
+
+    source_kwargs = {}
+    if args.sample_pages:
+        source_kwargs['sample_pages'] = args.sample_pages
+    if args.cache:
+        source_kwargs['cache'] = SpanCache(args.cache)
+
+    header_conditions_cls = DetectHeaderModel if args.header_model else \
+        DetectHeaderKIDStyled if args.header_style else DetectHeaderKID
+    runner = CorpusRunner(workers=args.workers, header_conditions_cls=header_conditions_cls,
+                          source_kwargs=source_kwargs, tasks_per_worker=args.tasks_per_worker,
+                          rule_stats=args.rule_stats, memo_size=args.memo_size)
+    summary = runner.run(args.inputs, args.output)
+    if args.rule_stats:
+        print(summary['rule_stats'].format(), file=sys.stderr)
+    print("processed {documents} documents ({failed} failed, {pages} pages) in {wall_time:.1f}s".format(**summary),
+          file=sys.stderr)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,23 @@
+import hashlib
+import io
+import json
+import time
 import fitz
+import numpy as np
 from typing import Generator, Any
-from mu_helper import doc_font_info, span_font_info, block_font_info
-from pdfstructure.model.document import Element
+from pdfstructure.extraction import extract_table, extract_table_parallel, select_pages, open_document, map_file, \
+    page_hashes
+from pdfstructure.model.document import Element, SpanElement, PageInfo
+from pdfstructure.model.spantable import SpanTable, StyleIndex
+from pdfstructure.analysis.estimate import stratified_sample, estimate_font_info, MIN_CONFIDENCE, SAMPLE_PAGES
+from pdfstructure.analysis.running import running_keys, running_mask
+from pdfstructure.cache import SpanCache, PageCache, hash_file, hash_buffer
 
+# document statistics the header rules compare spans against (font_stats), cached header labels stay valid as
+# long as these do not change. the font is compared by name, font ids depend on the extraction order
+LABEL_STYLE_KEYS = ('common_size_q', 'common_color', 'common_font')
+# page tables a lazy source keeps from its statistics scan for read_blocks, see FileSource(keep_bytes=...)
+KEEP_BYTES = 64 * 1024 * 1024
 
 
 class Source:
@@ -31,41 +46,396 @@ class Source:
         """
         pass
 
+    def header_labels(self, rules: str):
+        """
+        header labels of a previous parse, indexed by span_index: -1 unknown, 0 content, 1 header.
+        the parser fills in the unknown ones and hands the array back via @store_header_labels.
+        @param rules: name of the header detection the labels were computed with
+        @return: int8 array or None if the source keeps no labels
+        """
+        return None
+
+    def store_header_labels(self, rules: str, labels):
+        pass
+
+    def close(self):
+        """
+        release what the source holds open (document, file map), read spans stay available.
+        """
+        pass
+
 
 
 
 class FileSource(Source):
-    def __init__(self, file_path: str, page_numbers=None,
-                 **kwargs):
+    def __init__(self, file_path: str, page_numbers=None, workers=1, lazy=False, sample_pages=None,
+                 min_confidence=MIN_CONFIDENCE, cache: SpanCache = None, page_cache: PageCache = None,
+                 drop_running=True, keep_bytes=KEEP_BYTES, **kwargs):
+        """
+        @param file_path: path to pdf
+        @param page_numbers: 0-based page indices to parse, None parses the whole document
+        @param workers: number of processes extracting page ranges in parallel, 1 extracts in this process
+        @param lazy: extract pages only when they are requested (font_info / read_blocks) instead of up front,
+                     pages streamed by read_blocks are released afterwards. without @sample_pages the document
+                     statistics are a scan over all pages before the stream, see @keep_bytes
+        @param sample_pages: estimate the document style from a stratified sample of this many pages
+                     (implies lazy), see pdfstructure.analysis.estimate
+        @param min_confidence: samples below this confidence fall back to a full scan
+        @param cache: SpanCache, documents found in it are not extracted (nor opened) again. lazy sources store
+                     the table once all pages are extracted, read_blocks keeps the streamed pages for it
+        @param page_cache: PageCache, incremental mode: only pages changed since the last parse of this file
+                     are extracted and classified again (takes precedence over @cache and @lazy). the entry is
+                     kept under the uri, sources without uri are kept under their content hash
+        @param drop_running: leave running headers / footers (page numbers, document title, ...) out of the span
+                     stream, see pdfstructure.analysis.running. lazy sources detect them on a page sample
+        @param keep_bytes: lazy sources keep the pages of the statistics scan for read_blocks up to this many bytes
+                     of page tables, so they are extracted once. pages beyond are released after the scan and
+                     extracted again when streamed, memory stays bounded by @keep_bytes
+        """
         super().__init__(uri=file_path)
-        self.load()
-        self.page_numbers = page_numbers
+        # the document is opened on first access
+        self._doc = None
+        self.cache = cache if page_cache is None else None
+        self.page_cache = page_cache
+        # SpanTable of all requested pages, every page is extracted once and shared by font_info and read_blocks
+        self._spans = self.cached_table(page_numbers) if self.cache is not None else None
+        if self._spans is not None:
+            self.page_numbers = self._spans.pages['number'].tolist()
+        else:
+            self.page_numbers = select_pages(self.doc, page_numbers)
+        self.workers = workers
+        self.lazy = (lazy or bool(sample_pages)) and page_cache is None
+        self.sample_pages = sample_pages
+        self.min_confidence = min_confidence
+        self.drop_running = drop_running
+        self.keep_bytes = keep_bytes
+        self._running_keys = None
         self.params = kwargs
-        self.font_info = doc_font_info(self.doc)
+        # seconds spent per stage: 'extract' (PyMuPDF text dicts), 'font_info' (document statistics)
+        self.timings = {}
+        # lazy mode: page number -> SpanTable of that single page, all sharing one StyleIndex
+        self._tables = {}
+        self._index = StyleIndex()
+        self._font_info = None
+        # incremental mode: header labels per span of _spans, see Source.header_labels
+        self._labels = None
+        self._previous = None
+        self._labels_complete = False
+        self.changed_pages = None
+        if page_cache is not None:
+            self._spans = self.incremental_table()
+            self.close()
+        if not self.lazy:
+            if self._spans is None:
+                self._spans = self.extract()
+                self.store_cache()
+                # all pages are in the table, the document is not needed anymore
+                self.close()
+            self.load_font_info()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def doc(self):
+        if self._doc is None:
+            self.load()
+        return self._doc
+
+    @doc.setter
+    def doc(self, doc):
+        self._doc = doc
 
     def load(self,**kwargs):
         self.doc = fitz.open(self.uri, **kwargs)
 
+    def close(self):
+        """
+        close the document, extracted spans stay available. a later access of @doc opens it again.
+        """
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+
+    def content_hash(self) -> str:
+        return hash_file(self.uri)
+
+    def cached_table(self, page_numbers):
+        """
+        look up the SpanTable of this document in the cache.
+        @param page_numbers: requested page numbers, part of the cache key
+        """
+        settings = {'pages': sorted(set(page_numbers)) if page_numbers is not None else None}
+        self._cache_key = self.cache.key(self.content_hash(), settings)
+        return self.cache.get(self._cache_key)
+
+    def incremental_table(self) -> SpanTable:
+        """
+        SpanTable of the requested pages, pages whose content hash is unchanged since the last parse are taken
+        from @page_cache together with their header labels, only the changed pages are extracted.
+        """
+        self._page_hashes = page_hashes(self.doc, self.page_numbers)
+        # documents without uri (e.g. a BytesSource of a queue message) are kept under their content
+        identity = self.uri if self.uri is not None else self.content_hash()
+        self._page_key = self.page_cache.key(identity, {'pages': self.page_numbers})
+        entry = self._previous = self.page_cache.get_entry(self._page_key)
+        previous = {}
+        if entry is not None:
+            if entry['page_hashes'] == self._page_hashes:
+                # unchanged document, the stored table is used as it is
+                self.changed_pages = []
+                self._labels = entry['labels']
+                return entry['table']
+            previous = dict(zip(entry['table'].pages['number'].tolist(), entry['page_hashes']))
+
+        tables, labels, self.changed_pages = [], [], []
+        for number, page_hash in zip(self.page_numbers, self._page_hashes):
+            if previous.get(number) == page_hash:
+                page = entry['table'].page_rows(number)
+                tables.append(entry['table'].page_table(number))
+                labels.append(entry['labels'][int(page['span_start'][0]):int(page['span_stop'][0])])
+            else:
+                table = extract_table(self.doc, [number], timings=self.timings)
+                tables.append(table)
+                labels.append(np.full(len(table), -1, dtype='i1'))
+                self.changed_pages.append(number)
+        self._labels = np.concatenate(labels) if labels else np.empty(0, dtype='i1')
+        return SpanTable.concat(tables, index=self._index)
+
+    def style_hash(self) -> str:
+        """
+        hash of the document style, header labels are only valid for the style they were computed with.
+        """
+        font_info = self.font_info
+        style = [font_info['font_stats'][key] for key in LABEL_STYLE_KEYS] + [font_info['page_w'], font_info['page_h']]
+        return hashlib.sha256(json.dumps(style).encode()).hexdigest()
+
+    def header_labels(self, rules: str):
+        if self._labels is None:
+            return None
+        entry = self._previous
+        if entry is None or entry['rules'] != rules or entry['style_hash'] != self.style_hash():
+            # different rules or the edit changed the document style: everything has to be classified again
+            self._labels[:] = -1
+        known = self._labels >= 0
+        if self.drop_running:
+            # running headers / footers are not streamed, the parser never labels them
+            known |= running_mask(self.spans, self.running_keys)
+        self._labels_complete = bool(known.all())
+        return self._labels
+
+    def store_header_labels(self, rules: str, labels):
+        if self.page_cache is None or (self._labels_complete and not self.changed_pages):
+            # nothing changed since the stored parse
+            return
+        self.page_cache.put_entry(self._page_key, self.spans, self._page_hashes, labels, rules, self.style_hash())
+
     def config(self):
         return self.__dict__
 
+    def open_spec(self) -> dict:
+        """
+        picklable arguments of extraction.open_document, used by worker processes to open the same pdf
+        """
+        return {'filename': self.uri}
+
+    def extract(self) -> SpanTable:
+        if self.workers > 1:
+            return extract_table_parallel(self.doc, self.open_spec(), self.workers, self.page_numbers,
+                                          timings=self.timings)
+        return extract_table(self.doc, self.page_numbers, timings=self.timings)
+
+    def get_page_table(self, number, keep=True) -> SpanTable:
+        """
+        SpanTable of a single page, extracts it on demand.
+        @param number: page index
+        @param keep: keep the page cached, otherwise it is released from the cache
+        """
+        table = self._tables.get(number) if keep else self._tables.pop(number, None)
+        if table is None:
+            table = extract_table(self.doc, [number], timings=self.timings, index=self._index)
+            if keep:
+                self._tables[number] = table
+        return table
+
+    @property
+    def spans(self) -> SpanTable:
+        if self._spans is None:
+            self._spans = SpanTable.concat([self.get_page_table(number) for number in self.page_numbers],
+                                           index=self._index)
+            self._tables.clear()
+            self.close()
+            self.store_cache()
+        return self._spans
+
+    def store_cache(self):
+        """ put the table of all pages into @cache (if any), once it is complete"""
+        if self.cache is not None and self._spans is not None:
+            self.cache.put(self._cache_key, self._spans)
+
+    def load_font_info(self):
+        start = time.perf_counter()
+        if self.sample_pages and self._spans is None and len(self.page_numbers) > self.sample_pages:
+            self._font_info = self.estimate_font_info()
+        elif self._spans is None and self.lazy:
+            self._font_info = self.scan_font_info()
+        else:
+            self._font_info = self.spans.font_info()
+        self.timings['font_info'] = time.perf_counter() - start
+        return self._font_info
+
+    def estimate_font_info(self):
+        """
+        document style from a stratified page sample, full scan if the sample is ambiguous.
+        the sampled pages stay cached for read_blocks.
+        """
+        sample = stratified_sample(self.page_numbers, self.sample_pages)
+        table = SpanTable.concat([self.get_page_table(number) for number in sample], index=self._index)
+        font_info, confidence = estimate_font_info(table, sample, self.min_confidence)
+        if font_info is None:
+            font_info = self.scan_font_info()
+            font_info['estimate'] = {'pages': sample, 'confidence': confidence, 'full_scan': True}
+        return font_info
+
+    def scan_font_info(self):
+        """
+        document style over all pages, page by page: the statistics spans of every page (see
+        SpanTable.stats_table) and the extracted pages up to @keep_bytes are kept, read_blocks streams those
+        without extracting them again.
+        """
+        stats = []
+        kept = sum(table.nbytes for table in self._tables.values())
+        for number in self.page_numbers:
+            table = self._tables.get(number)
+            if table is None:
+                table = extract_table(self.doc, [number], timings=self.timings, index=self._index)
+                if kept + table.nbytes <= self.keep_bytes:
+                    self._tables[number] = table
+                    kept += table.nbytes
+            stats.append(table.stats_table())
+        return SpanTable.concat(stats, index=self._index).font_info()
+
+    @property
+    def font_info(self):
+        if self._font_info is None:
+            self.load_font_info()
+        return self._font_info
+
+    @property
+    def running_keys(self):
+        """
+        (text, position) keys of the running headers / footers of the document, see analysis.running.
+        lazy sources only look at a stratified page sample, running elements repeat all over the document.
+        """
+        if self._running_keys is None:
+            if self._spans is not None:
+                table = self._spans
+            else:
+                sample = stratified_sample(self.page_numbers, self.sample_pages or SAMPLE_PAGES)
+                table = SpanTable.concat([self.get_page_table(number) for number in sample], index=self._index)
+            self._running_keys = running_keys(table)
+        return self._running_keys
+
 
     def read_blocks(self) -> Generator:
         #generate stream of spans
-        pNumber = 0
-        for page in self.doc:
-            _blocks = page.get_text("dict", sort=True)["blocks"]
-            for _block in _blocks:
-                if _block['type'] == 0:
-                    block = Element(pNumber, original_block=_block, original_page=page)
-                    for line in block.lines:
-                        for span in line['spans']:
-                            block.span_styles = span_font_info(span)
-                            block.text = span['text']
-                            
-                            yield block
-            pNumber += 1
+        if self.drop_running:
+            # detect before streaming, lazy sources extract their sample pages now
+            self.running_keys
+        # pages of a cached source are kept until all are streamed, their table is stored afterwards
+        keep = self.cache is not None
+        if self._spans is not None:
+            tables = [self._spans]
+        else:
+            tables = (self.get_page_table(number, keep=keep) for number in self.page_numbers)
+        for table in tables:
+            yield from self.read_table(table)
+        if keep and self._spans is None:
+            self.spans
+        self.close()
+
+    def read_table(self, table: SpanTable) -> Generator:
+        pages = {int(row['number']): PageInfo.from_row(row) for row in table.pages}
+        running = running_mask(table, self.running_keys) if self.drop_running else None
+        for b, page_number in enumerate(table.blocks['page'].tolist()):
+            span_start, span_stop = table.blocks['span_start'][b], table.blocks['span_stop'][b]
+            if running is not None and running[span_start:span_stop].all():
+                continue
+            block = Element(page_number, original_block=None, page_info=pages[page_number],
+                            span_table=table, block_index=b)
+            for span_index in range(span_start, span_stop):
+                if running is None or not running[span_index]:
+                    yield SpanElement(block, span_index, table.span_text(span_index), table.span_styles(span_index))
+
+
+class BytesSource(FileSource):
+    """
+    reads a PDF held in memory, e.g. received from a queue, without a temp file round trip.
+    bytes and memoryviews are handed to PyMuPDF as they are, bytearray and BytesIO are wrapped in a
+    memoryview instead of being copied.
+    """
+
+    def __init__(self, data, uri=None, **kwargs):
+        """
+        @param data: pdf content as bytes, bytearray, memoryview or io.BytesIO
+        @param uri: optional name of the document, e.g. its origin
+        """
+        self.buffer = as_buffer(data)
+        super().__init__(file_path=uri, **kwargs)
+
+    def load(self, **kwargs):
+        self.doc = open_document(stream=self.buffer, **kwargs)
+
+    def content_hash(self) -> str:
+        return hash_buffer(self.buffer)
+
+    def open_spec(self) -> dict:
+        # worker processes cannot share the buffer, every worker receives one copy
+        return {'stream': bytes(self.buffer)}
+
+
+class MmapSource(FileSource):
+    """
+    reads a PDF file through a read-only memory map instead of reading the whole file into memory.
+    the map is unmapped together with the document in @close.
+    """
+
+    def __init__(self, file_path: str, **kwargs):
+        self._map = None
+        super().__init__(file_path, **kwargs)
+
+    def load(self, **kwargs):
+        self._map = map_file(self.uri)
+        self.doc = open_document(stream=memoryview(self._map), **kwargs)
+
+    def close(self):
+        doc = self._doc
+        super().close()
+        if doc is not None:
+            # the document's stream exports the map, it has to be released before the map can be closed
+            doc.stream.release()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
 
+    def open_spec(self) -> dict:
+        return {'filename': self.uri, 'use_mmap': True}
+
+
+def as_buffer(data):
+    """
+    zero-copy view of in-memory pdf data that PyMuPDF accepts as stream (bytes or memoryview)
+    """
+    if isinstance(data, (bytes, memoryview)):
+        return data
+    if isinstance(data, bytearray):
+        return memoryview(data)
+    if isinstance(data, io.BytesIO):
+        return data.getbuffer()
+    raise TypeError("unsupported pdf data type: {}".format(type(data)))
 
 
 
@@ -0,0 +1,62 @@
+import sys
+import time
+import tracemalloc
+import fitz
+from mu_helper import STATS_CLIP_TOP, STATS_CLIP_BOTTOM
+from pdfstructure.extraction import extract_page, extract_table
+
+# compares the former two pass extraction (document statistics and read_blocks each calling get_text)
+# with the shared single pass of pdfstructure.extraction
+# usage: python -m scratch.bench_extraction data/sample_kids/pictet_eltif.pdf
+
+
+def two_pass(path):
+    doc = fitz.open(path)
+    # statistics pass over the clipped pages, as the former mu_helper.doc_font_info
+    for page in doc:
+        rect = fitz.Rect(0, STATS_CLIP_TOP, page.rect.width, page.rect.height - STATS_CLIP_BOTTOM)
+        page.get_text("dict", sort=True, clip=rect)
+    for page in doc:
+        page.get_text("dict", sort=True)
+
+
+def single_pass(path):
+    doc = fitz.open(path)
+    extract_table(doc).font_info()
+
+
+def page_dicts(doc):
+    """the extracted page dicts, as the sources kept them before the SpanTable"""
+    return [extract_page(page) for page in doc]
+
+
+def retained_memory(func, path):
+    """bytes still allocated by the result of func, i.e. what a source keeps alive"""
+    doc = fitz.open(path)
+    tracemalloc.start()
+    result = func(doc)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def bench(func, path, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        old = bench(two_pass, path)
+        new = bench(single_pass, path)
+        print("{}: two pass {:.3f}s, single pass {:.3f}s, saved {:.3f}s ({:.0f}%)".format(
+            path, old, new, old - new, (old - new) * 100 / old))
+        dicts = retained_memory(page_dicts, path)
+        table = retained_memory(extract_table, path)
+        print("{}: page dicts {:.0f}kB, SpanTable {:.0f}kB".format(path, dicts / 1024, table / 1024))
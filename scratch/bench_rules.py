@@ -0,0 +1,103 @@
+import sys
+import time
+from pdfstructure.hierarchy.detectheader import DetectHeaderKID, DetectHeaderKIDStyled, AnyOf
+from pdfstructure.analysis.geometry import span_geometry
+from pdfstructure.analysis.textfeatures import text_features
+from pdfstructure.source import FileSource
+
+# measures cost (us per span) and pass rate of every header rule, the costs declared on the Rule objects of
+# pdfstructure.hierarchy.detectheader come from this script
+# usage: python -m scratch.bench_rules data/sample_kids/*.pdf
+
+
+def load_elements(paths):
+    elements = []
+    for path in paths:
+        source = FileSource(path)
+        doc_styles = source.font_info
+        for element in source.read_blocks():
+            element.page_w = doc_styles['page_w']
+            element.page_h = doc_styles['page_h']
+            elements.append((element, doc_styles))
+    return elements
+
+
+def flat_rules(detect_cls):
+    for rule in detect_cls.rules:
+        yield from rule.rules if isinstance(rule, AnyOf) else (rule,)
+
+
+def clear_features(elements):
+    # text features and geometry are cached on the span (and its table), every measurement starts without them
+    for element, _ in elements:
+        element.text_features = None
+        element.geometry = None
+        element.span_table.geometry = None
+
+
+def bench_pipeline(detect_cls, elements):
+    clear_features(elements)
+    start = time.perf_counter()
+    headers = sum(detect_cls.check(element, doc_styles) for element, doc_styles in elements)
+    return (time.perf_counter() - start) * 1e6 / len(elements), headers
+
+
+def bench_batched(detect_cls, elements):
+    clear_features(elements)
+    start = time.perf_counter()
+    headers, table, values = 0, None, None
+    for element, doc_styles in elements:
+        if element.span_table is not table:
+            table = element.span_table
+            values = detect_cls.evaluate_batch(table, doc_styles)
+        headers += detect_cls.check_batched(element, doc_styles, values)
+    return (time.perf_counter() - start) * 1e6 / len(elements), headers
+
+
+def bench_style_filter(detect_cls, elements):
+    """
+    pipeline with the StyleFilter of every document (style rules once per distinct style)
+    @return: us per span, headers, share of spans rejected by their style
+    """
+    clear_features(elements)
+    start = time.perf_counter()
+    headers, rejected, doc, style_filter = 0, 0, None, None
+    for element, doc_styles in elements:
+        if doc_styles is not doc:
+            doc = doc_styles
+            style_filter = detect_cls.style_filter(doc_styles)
+        headers += detect_cls.check(element, doc_styles, style_filter)
+        verdict = style_filter.verdict(element)
+        rejected += verdict is not None and verdict.rejected_by is not None
+    return (time.perf_counter() - start) * 1e6 / len(elements), headers, rejected / len(elements)
+
+
+if __name__ == "__main__":
+    elements = load_elements(sys.argv[1:])
+    # cost of the shared text features and geometry (paid by the first rule reading them) and of the rules on top
+    clear_features(elements)
+    start = time.perf_counter()
+    for element, _ in elements:
+        text_features(element)
+    print("text features   cost {:5.2f}us".format((time.perf_counter() - start) * 1e6 / len(elements)))
+    start = time.perf_counter()
+    for element, _ in elements:
+        span_geometry(element)
+    print("geometry        cost {:5.2f}us".format((time.perf_counter() - start) * 1e6 / len(elements)))
+    for rule in flat_rules(DetectHeaderKID):
+        start = time.perf_counter()
+        passed = sum(rule(element, doc_styles) for element, doc_styles in elements)
+        cost = (time.perf_counter() - start) * 1e6 / len(elements)
+        print("{:15s} cost {:5.2f}us  declared {:5.2f}  pass {:.2f}".format(rule.label, cost, rule.cost,
+                                                                           passed / len(elements)))
+    cost, headers = bench_pipeline(DetectHeaderKID, elements)
+    print("pipeline {:.2f}us per span, {} headers in {} spans".format(cost, headers, len(elements)))
+    cost, batched = bench_batched(DetectHeaderKID, elements)
+    print("batch pipeline {:.2f}us per span, {} headers".format(cost, batched))
+
+    for detect_cls in (DetectHeaderKIDStyled,):
+        cost, headers = bench_pipeline(detect_cls, elements)
+        print("{} pipeline {:.2f}us per span, {} headers".format(detect_cls.__name__, cost, headers))
+        cost, headers, rejected = bench_style_filter(detect_cls, elements)
+        print("{} style filter {:.2f}us per span, {} headers, {:.1%} of spans rejected by style".format(
+            detect_cls.__name__, cost, headers, rejected))
@@ -0,0 +1,39 @@
+import sys
+from pdfstructure.analysis.geometry import span_geometry
+from pdfstructure.analysis.textfeatures import text_features
+from pdfstructure.hierarchy.detectheader import DetectHeaderKID
+from pdfstructure.hierarchy.parser import HierarchyParser
+from pdfstructure.hierarchy.traversal import traverse_in_order
+from pdfstructure.model.document import ParagraphElement
+from pdfstructure.source import FileSource
+
+# consistency of the coalesced paragraphs: every span is found at its offset, span_pieces maps any text range
+# back to the span texts, rule features describe the paragraph and not its first span
+# usage: python -m scratch.check_paragraphs data/sample_kids/*.pdf
+
+
+def check_paragraph(paragraph: ParagraphElement):
+    text = paragraph.text
+    for span, offset in zip(paragraph.spans, paragraph.offsets):
+        assert text[offset:offset + len(span.text)] == span.text, (text, offset, span.text)
+    # a range across span borders (and the separators between lines) gives back exactly the covered span texts
+    for start, end in ((0, len(text)), (len(text) // 3, 2 * len(text) // 3)):
+        covered = [(span, a, b) for span, a, b in paragraph.span_pieces(start, end)]
+        pieces = "".join(span.text[a:b] for span, a, b in covered)
+        assert pieces == "".join(c for i, c in enumerate(text[start:end], start)
+                                 if any(o <= i < o + len(s.text) for s, o in zip(paragraph.spans, paragraph.offsets)))
+    assert text_features(paragraph).length == len(text)
+    assert span_geometry(paragraph) is not None
+    assert paragraph.span_styles['bbox'][2] >= max(span.span_styles['bbox'][2] for span in paragraph.spans)
+
+
+if __name__ == "__main__":
+    parser = HierarchyParser(DetectHeaderKID)
+    for path in sys.argv[1:]:
+        document = parser.structure_document(FileSource(path))
+        paragraphs = [section.element for section in traverse_in_order(document)
+                      if isinstance(section.element, ParagraphElement)]
+        for paragraph in paragraphs:
+            check_paragraph(paragraph)
+        print("{}: {} paragraphs ok, {} of several spans".format(
+            path, len(paragraphs), sum(len(paragraph.spans) > 1 for paragraph in paragraphs)))
@@ -0,0 +1,55 @@
+import sys
+import time
+from collections import defaultdict
+import numpy as np
+from pdfstructure.hierarchy.classifier import (DetectHeaderModel, HeaderModel, read_labels, training_data, scores,
+                                               default_model)
+from pdfstructure.hierarchy.detectheader import DetectHeaderKID
+from scratch.bench_rules import load_elements, clear_features, bench_batched
+
+# speed and accuracy of the trained header classifier vs the KID rules.
+# accuracy is measured on the spans labelled in the csv, the model leaving out the document it is tested on
+# usage: python -m scratch.compare_classifier output.csv data/sample_kids/*.pdf
+
+
+def rules_accuracy(elements, labels):
+    predicted, y = [], []
+    for element, doc_styles in elements:
+        if element.text in labels:
+            predicted.append(DetectHeaderKID.check(element, doc_styles))
+            y.append(labels[element.text])
+    return scores(np.array(predicted), np.array(y))
+
+
+def leave_one_out(data):
+    predicted, y = [], []
+    for test in data:
+        X_train = np.vstack([X for file_path, (X, _) in data.items() if file_path != test])
+        y_train = np.concatenate([y for file_path, (_, y) in data.items() if file_path != test])
+        X_test, y_test = data[test]
+        predicted.append(HeaderModel.fit(X_train, y_train).predict(X_test))
+        y.append(y_test)
+    return scores(np.concatenate(predicted), np.concatenate(y))
+
+
+if __name__ == "__main__":
+    labels = read_labels(sys.argv[1])
+    paths = sys.argv[2:]
+    elements = load_elements(paths)
+    data = training_data(paths, labels)
+
+    print("rules             ", rules_accuracy(elements, labels))
+    print("model leave 1 out ", leave_one_out(data))
+    shipped = default_model()
+    X = np.vstack([X for X, _ in data.values()])
+    y = np.concatenate([y for _, y in data.values()])
+    print("model shipped     ", scores(shipped.predict(X), y))
+
+    for detect_cls in (DetectHeaderKID, DetectHeaderModel):
+        clear_features(elements)
+        start = time.perf_counter()
+        per_span = sum(detect_cls.check(element, doc_styles) for element, doc_styles in elements)
+        per_span_cost = (time.perf_counter() - start) * 1e6 / len(elements)
+        cost, headers = bench_batched(detect_cls, elements)
+        print("{:18s} per span {:7.2f}us ({} headers), batch {:5.2f}us per span ({} headers)".format(
+            detect_cls.__name__, per_span_cost, per_span, cost, headers))
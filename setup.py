@@ -8,5 +8,11 @@ setup(
     license='',
     author='fundrisq',
     author_email='',
-    description=''
+    description='',
+    entry_points={
+        'console_scripts': [
+            'pdfstructure-batch=pdfstructure.runner:main',
+            'pdfstructure-train-header=pdfstructure.hierarchy.classifier:main',
+        ],
+    },
 )
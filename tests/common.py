@@ -0,0 +1,56 @@
+"""
+shared by the tests: the bundled sample pdfs and a comparable outline of a parsed document.
+"""
+import os
+from functools import lru_cache
+import numpy as np
+from pdfstructure.hierarchy.detectheader import DetectHeaderKID
+from pdfstructure.hierarchy.parser import HierarchyParser
+from pdfstructure.source import FileSource
+
+SAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "sample_kids")
+# short documents with and without running headers and a long one (117 pages)
+SAMPLE_FILES = ("ab_kid.pdf", "fid_kid.pdf", "pictet_eltif.pdf")
+
+
+def sample(name) -> str:
+    return os.path.join(SAMPLES, name)
+
+
+def parse(source, header_conditions_cls=DetectHeaderKID, **kwargs):
+    return HierarchyParser(header_conditions_cls, **kwargs).structure_document(source)
+
+
+def outline(document) -> list:
+    """
+    (depth, level, label, heading text, page) of every section in document order, equal for equal trees.
+    """
+    rows = []
+
+    def walk(section, depth):
+        rows.append((depth, section.level, getattr(section, 'label', None), section.heading_text,
+                     getattr(section.element, 'page_number', None)))
+        for child in section.children:
+            walk(child, depth + 1)
+
+    for section in document.elements:
+        walk(section, 0)
+    return rows
+
+
+@lru_cache(maxsize=None)
+def reference(name, page_numbers=None, drop_running=True):
+    """
+    outline and document style of an eager parse, what the other source modes are compared with.
+    @param page_numbers: tuple of page numbers or None
+    """
+    source = FileSource(sample(name), page_numbers=page_numbers and list(page_numbers), drop_running=drop_running)
+    return outline(parse(source)), source.font_info['font_stats']
+
+
+def same_table(a, b) -> bool:
+    """
+    SpanTables @a and @b hold the same arrays, i.e. the same spans, styles and layout.
+    """
+    a, b = a.arrays(), b.arrays()
+    return a.keys() == b.keys() and all(np.array_equal(a[key], b[key]) for key in a)
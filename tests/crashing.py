@@ -0,0 +1,15 @@
+"""
+process_document of a worker that crashes on one document, see test_runner. worker processes are spawned and
+import it from here.
+"""
+import os
+from pdfstructure.runner import process_document as _process_document
+
+CRASHING = "cp_kid.pdf"
+
+
+def process_document(file_path, *args):
+    if os.path.basename(file_path) == CRASHING:
+        # dies like a segfault in native code, without raising
+        os._exit(11)
+    return _process_document(file_path, *args)
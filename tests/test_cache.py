@@ -0,0 +1,115 @@
+import os
+import shutil
+import fitz
+import pytest
+import pdfstructure.cache
+from pdfstructure.cache import PageCache, SpanCache
+from pdfstructure.source import BytesSource, FileSource
+from tests.common import outline, parse, reference, same_table, sample
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SpanCache(str(tmp_path / "spans"))
+
+
+@pytest.mark.parametrize("name", ["ab_kid.pdf", "pictet_eltif.pdf"])
+def test_cache_hit_matches_extraction(cache, name):
+    extracted = FileSource(sample(name), cache=cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+    cached = FileSource(sample(name), cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    # found in the cache, the pdf is not opened
+    assert cached._doc is None
+    assert same_table(cached.spans, extracted.spans)
+    assert outline(parse(cached)) == reference(name)[0]
+
+
+def test_cache_key_includes_page_numbers(cache):
+    FileSource(sample("pictet_eltif.pdf"), cache=cache)
+    source = FileSource(sample("pictet_eltif.pdf"), page_numbers=[3, 4, 5], cache=cache)
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert source.page_numbers == [3, 4, 5]
+
+
+@pytest.mark.parametrize("kwargs", [{'lazy': True}, {'sample_pages': 8}])
+def test_lazy_sources_store_the_table(cache, kwargs):
+    parse(FileSource(sample("pictet_eltif.pdf"), cache=cache, **kwargs))
+    cached = FileSource(sample("pictet_eltif.pdf"), cache=cache)
+    assert cache.hits == 1
+    # the sampled pages are extracted first, style ids may be numbered differently than in an eager extraction
+    assert outline(parse(cached)) == reference("pictet_eltif.pdf")[0]
+
+
+def test_entry_evicted_after_load(cache, monkeypatch):
+    FileSource(sample("ab_kid.pdf"), cache=cache)
+
+    def evicted(path, *args, **kwargs):
+        raise FileNotFoundError(path)
+
+    # another process evicts the entry between load and touch
+    monkeypatch.setattr(pdfstructure.cache.os, "utime", evicted)
+    source = FileSource(sample("ab_kid.pdf"), cache=cache)
+    assert cache.hits == 1
+    assert outline(parse(source)) == reference("ab_kid.pdf")[0]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SpanCache(str(tmp_path))
+    FileSource(sample("ab_kid.pdf"), cache=cache)
+    cache.max_bytes = cache.size
+    first = os.listdir(str(tmp_path))
+    FileSource(sample("fid_kid.pdf"), cache=cache)
+    assert cache.size <= cache.max_bytes
+    assert not set(first) & set(os.listdir(str(tmp_path)))
+
+
+@pytest.fixture
+def page_cache(tmp_path, monkeypatch):
+    page_cache = PageCache(str(tmp_path / "pages"))
+    page_cache.writes = []
+    put_entry = page_cache.put_entry
+
+    def counting_put_entry(key, *args, **kwargs):
+        page_cache.writes.append(key)
+        return put_entry(key, *args, **kwargs)
+
+    monkeypatch.setattr(page_cache, "put_entry", counting_put_entry)
+    return page_cache
+
+
+@pytest.mark.parametrize("name", ["ab_kid.pdf", "pictet_eltif.pdf"])
+@pytest.mark.parametrize("drop_running", [True, False])
+def test_unchanged_document_is_stored_once(page_cache, name, drop_running):
+    for _ in range(3):
+        source = FileSource(sample(name), page_cache=page_cache, drop_running=drop_running)
+        assert outline(parse(source)) == reference(name, drop_running=drop_running)[0]
+    assert source.changed_pages == []
+    assert len(page_cache.writes) == 1
+
+
+def test_edited_page_is_extracted_again(page_cache, tmp_path):
+    path = str(tmp_path / "document.pdf")
+    shutil.copy(sample("ab_kid.pdf"), path)
+    parse(FileSource(path, page_cache=page_cache))
+    doc = fitz.open(sample("ab_kid.pdf"))
+    doc[1].insert_text((72, 400), "Text inserted by an edit", fontsize=9)
+    doc.save(path)
+    doc.close()
+    source = FileSource(path, page_cache=page_cache)
+    assert outline(parse(source)) == outline(parse(FileSource(path)))
+    assert source.changed_pages == [1]
+    assert len(page_cache.writes) == 2
+
+
+def test_sources_without_uri_are_kept_by_content(page_cache):
+    data = {}
+    for name in ("ab_kid.pdf", "fid_kid.pdf"):
+        with open(sample(name), "rb") as fp:
+            data[name] = fp.read()
+    for _ in range(2):
+        for name in data:
+            source = BytesSource(data[name], page_cache=page_cache)
+            assert outline(parse(source)) == reference(name)[0]
+    assert len(page_cache.writes) == 2
+    assert source.changed_pages == []
@@ -0,0 +1,105 @@
+import asyncio
+import functools
+import json
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from pdfstructure.analysis.textfeatures import text_features
+from pdfstructure.hierarchy.detectheader import DetectHeaderKID
+from pdfstructure.hierarchy.parser import AsyncHierarchyParser, HierarchyParser
+from pdfstructure.hierarchy.traversal import traverse_in_order, traverse_sections
+from pdfstructure.model.document import ParagraphElement
+from pdfstructure.model.sectiontree import SectionTree, TreeSection
+from pdfstructure.printer import JsonStringPrinter
+from pdfstructure.source import FileSource
+from tests.common import SAMPLE_FILES, outline, parse, reference, sample
+
+
+def test_async_parser_matches_sync():
+    async def parse_all():
+        parser = AsyncHierarchyParser(HierarchyParser(DetectHeaderKID), max_documents=2)
+        # sources and factories, the factories extract in the executor
+        return await asyncio.gather(parser.structure_document(FileSource(sample(SAMPLE_FILES[0]))),
+                                    *(parser.structure_document(functools.partial(FileSource, sample(name)))
+                                      for name in SAMPLE_FILES[1:]))
+
+    documents = asyncio.run(parse_all())
+    assert [outline(document) for document in documents] == [reference(name)[0] for name in SAMPLE_FILES]
+
+
+def test_async_parser_needs_threads():
+    with pytest.raises(TypeError):
+        AsyncHierarchyParser(HierarchyParser(DetectHeaderKID), executor=ProcessPoolExecutor(1))
+
+
+def flat(sections, depth=0) -> list:
+    return [row for section in sections
+            for row in [(depth, section['level'], section['heading'], section['page'])] +
+            flat(section['children'], depth + 1)]
+
+
+@pytest.mark.parametrize("name", SAMPLE_FILES[:2])
+def test_json_printer_writes_the_tree(name):
+    document = parse(FileSource(sample(name)))
+    printed = json.loads(JsonStringPrinter().print(document))
+    assert flat(printed['elements']) == [(depth, level, heading, page)
+                                         for depth, level, _, heading, page in outline(document)]
+
+
+def test_tree_sections_keep_no_dict():
+    document = parse(FileSource(sample("ab_kid.pdf")))
+    for section in traverse_in_order(document):
+        assert isinstance(section, TreeSection) and not hasattr(section, '__dict__')
+
+
+def test_unordered_tree_walks_in_pre_order():
+    document = parse(FileSource(sample("ab_kid.pdf")))
+    first, second = [section for section in document.elements if section.children][:2]
+    tree = SectionTree()
+    node = tree.graft(first)
+    tree.graft(second)
+    # below a node that is not the last one, subtrees are no ranges of nodes anymore
+    tree.graft(second, node)
+    assert not tree.ordered
+    # the copy of second is the last child of first
+    expected = [section.heading_text for section in chain(traverse_sections([first]), [second],
+                                                          traverse_sections([second]))]
+    assert [tree.section(child).heading_text for child in tree.descendants(node)] == expected
+
+
+def paragraphs(document) -> list:
+    return [section.element for section in traverse_in_order(document)
+            if isinstance(section.element, ParagraphElement)]
+
+
+@pytest.mark.parametrize("name", SAMPLE_FILES)
+def test_paragraph_offsets(name):
+    merged = 0
+    for paragraph in paragraphs(parse(FileSource(sample(name)))):
+        text = paragraph.text
+        for span, offset in zip(paragraph.spans, paragraph.offsets):
+            assert text[offset:offset + len(span.text)] == span.text
+        covered = [i for span, offset in zip(paragraph.spans, paragraph.offsets)
+                   for i in range(offset, offset + len(span.text))]
+        # a range across span borders gives back exactly the covered span texts, without the line separators
+        for start, end in ((0, len(text)), (len(text) // 3, 2 * len(text) // 3)):
+            pieces = "".join(span.text[a:b] for span, a, b in paragraph.span_pieces(start, end))
+            assert pieces == "".join(text[i] for i in covered if start <= i < end)
+        assert text_features(paragraph).length == len(text)
+        assert paragraph.span_styles['bbox'][2] >= max(span.span_styles['bbox'][2] for span in paragraph.spans)
+        merged += len(paragraph.spans) > 1
+    assert merged
+
+
+@pytest.mark.parametrize("name", SAMPLE_FILES)
+def test_paragraphs_hold_the_spans_of_a_section_per_span(name):
+    def spans(document):
+        return [(span.page_number, span.span_index) for section in traverse_in_order(document)
+                for span in getattr(section.element, 'spans', [section.element]) if span is not None]
+
+    per_span = parse(FileSource(sample(name)), coalesce=False)
+    coalesced = parse(FileSource(sample(name)))
+    assert spans(coalesced) == spans(per_span)
+    # only content is merged, the headings are the same
+    assert [row for row in outline(coalesced) if row[2] == 'heading'] == \
+        [row for row in outline(per_span) if row[2] == 'heading']
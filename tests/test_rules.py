@@ -0,0 +1,88 @@
+import pytest
+from pdfstructure.hierarchy.detectheader import BATCH_MASK, DetectHeaderKID, DetectHeaderKIDStyled
+from pdfstructure.hierarchy.rulememo import DEFAULT_MEMO_SIZE, RuleMemo
+from pdfstructure.source import FileSource
+from tests.common import SAMPLE_FILES, outline, parse, sample
+
+DETECT_CLASSES = [DetectHeaderKID, DetectHeaderKIDStyled]
+
+
+def spans(name):
+    """
+    document style and the spans of a document, prepared as the parser hands them to the rules
+    """
+    source = FileSource(sample(name), drop_running=False)
+    doc_styles = source.font_info
+    elements = list(source.read_blocks())
+    for element in elements:
+        element.page_w = doc_styles['page_w']
+        element.page_h = doc_styles['page_h']
+    return source, doc_styles, elements
+
+
+@pytest.mark.parametrize("detect_cls", DETECT_CLASSES)
+@pytest.mark.parametrize("name", SAMPLE_FILES)
+def test_batch_rules_match_per_span(detect_cls, name):
+    source, doc_styles, elements = spans(name)
+    values = detect_cls.evaluate_batch(source.spans, doc_styles)
+    members = [member for rule in detect_cls.rules for member in rule.flat() if member.batchable]
+    assert members
+    for element in elements:
+        for member in members:
+            assert values[member.label][element.span_index] == member(element, doc_styles), \
+                (member.label, element.text)
+        verdict = detect_cls.check(element, doc_styles)
+        assert values[BATCH_MASK][element.span_index] or not verdict
+        assert detect_cls.check_batched(element, doc_styles, values) == verdict, element.text
+
+
+@pytest.mark.parametrize("detect_cls", DETECT_CLASSES)
+@pytest.mark.parametrize("name", SAMPLE_FILES[:2])
+def test_parser_modes_give_the_same_tree(detect_cls, name):
+    expected = outline(parse(FileSource(sample(name)), detect_cls, batch=False))
+    for kwargs in ({'batch': True}, {'instrument': True}, {'instrument': True, 'exhaustive': True}):
+        assert outline(parse(FileSource(sample(name)), detect_cls, **kwargs)) == expected, kwargs
+
+
+@pytest.mark.parametrize("name", SAMPLE_FILES)
+def test_style_filter_keeps_the_verdicts(name):
+    source, doc_styles, elements = spans(name)
+    detect_cls = DetectHeaderKIDStyled
+    style_filter = detect_cls.style_filter(doc_styles)
+    values = detect_cls.evaluate_batch(source.spans, doc_styles)
+    for element in elements:
+        verdict = detect_cls.check(element, doc_styles)
+        assert detect_cls.check(element, doc_styles, style_filter) == verdict, element.text
+        assert detect_cls.check_batched(element, doc_styles, values, style_filter) == verdict, element.text
+    # every span was looked up by its style, the style rules ran once per distinct style
+    assert 0 < len(style_filter.verdicts) < len(elements)
+
+
+def headers(document) -> set:
+    return {(text, page) for _, _, label, text, page in outline(document) if label == 'heading'}
+
+
+@pytest.mark.parametrize("name", SAMPLE_FILES)
+def test_style_must_have_only_removes_headers(name):
+    # KID has no style only must have, DetectHeaderKIDStyled adds one: a different rule set, not a prefilter of KID
+    assert DetectHeaderKID.style_filter({}) is None
+    assert headers(parse(FileSource(sample(name)), DetectHeaderKIDStyled)) <= \
+        headers(parse(FileSource(sample(name)), DetectHeaderKID))
+
+
+@pytest.mark.parametrize("detect_cls", DETECT_CLASSES)
+@pytest.mark.parametrize("name", SAMPLE_FILES)
+def test_memo_keeps_the_tree(detect_cls, name):
+    expected = outline(parse(FileSource(sample(name)), detect_cls))
+    for batch in (True, False):
+        document = parse(FileSource(sample(name)), detect_cls, batch=batch, memo_size=DEFAULT_MEMO_SIZE)
+        assert outline(document) == expected
+        assert document.metadata['rule_memo']['hits'] > 0
+
+
+def test_memo_is_bounded():
+    memo = RuleMemo(2)
+    for key in "abc":
+        memo.put(key, True)
+    assert memo.get("a") is None and memo.get("c") is True
+    assert len(memo) == 2 and memo.to_dict()['hit_rate'] == 0.5
@@ -0,0 +1,32 @@
+import pdfstructure.runner
+from pdfstructure.runner import CorpusRunner, process_document
+from pdfstructure.source import FileSource
+from tests import crashing
+from tests.common import parse, sample
+
+FILES = [sample(name) for name in ("ab_kid.pdf", "cp_kid.pdf", "fid_kid.pdf")]
+
+
+def test_record_outline_lists_detected_headings():
+    record = process_document(sample("ab_kid.pdf"))
+    assert record['ok'] and record['pages'] == 4
+    document = parse(FileSource(sample("ab_kid.pdf")))
+    assert record['sections'] == len(document.elements)
+    assert record['headings'] == len(record['outline']) > record['sections']
+    assert all(heading.strip() for _, heading, _ in record['outline'])
+
+
+def test_crash_fails_only_the_crashing_document(monkeypatch):
+    monkeypatch.setattr(pdfstructure.runner, "process_document", crashing.process_document)
+    records = {record['file']: record for record in CorpusRunner(workers=3).iter_results(FILES)}
+    assert sorted(records) == sorted(FILES)
+    failed = [path for path, record in records.items() if not record['ok']]
+    assert failed == [sample(crashing.CRASHING)]
+    assert records[sample(crashing.CRASHING)]['error'] == 'worker process terminated abruptly'
+
+
+def test_run_writes_a_record_per_document(tmp_path):
+    output = tmp_path / "results.jsonl"
+    summary = CorpusRunner(workers=2).run(FILES, str(output))
+    assert summary['documents'] == 3 and summary['failed'] == 0
+    assert len(output.read_text().splitlines()) == 3
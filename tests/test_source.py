@@ -0,0 +1,97 @@
+import io
+import numpy as np
+import pytest
+import pdfstructure.source
+from pdfstructure.analysis.running import running_mask
+from pdfstructure.source import BytesSource, FileSource, MmapSource
+from tests.common import SAMPLE_FILES, outline, parse, reference, same_table, sample
+
+
+def parsed(source):
+    return outline(parse(source)), source.font_info['font_stats']
+
+
+@pytest.mark.parametrize("name", SAMPLE_FILES)
+def test_lazy_matches_eager(name):
+    assert parsed(FileSource(sample(name), lazy=True)) == reference(name)
+
+
+def test_lazy_page_numbers_match_eager():
+    source = FileSource(sample("pictet_eltif.pdf"), page_numbers=[3, 4, 5], lazy=True)
+    assert parsed(source) == reference("pictet_eltif.pdf", (3, 4, 5))
+    assert source.page_numbers == [3, 4, 5]
+
+
+def test_lazy_beyond_keep_bytes_matches_eager():
+    source = FileSource(sample("pictet_eltif.pdf"), lazy=True, keep_bytes=0)
+    source.font_info
+    # the statistics scan kept no page, read_blocks extracts them again
+    assert not source._tables
+    assert parsed(source) == reference("pictet_eltif.pdf")
+
+
+@pytest.mark.parametrize("kwargs", [{}, {'lazy': True}, {'lazy': True, 'page_numbers': [3, 4, 5]}])
+def test_pages_extracted_once(monkeypatch, kwargs):
+    extracted = []
+    extract_table = pdfstructure.source.extract_table
+
+    def counting_extract_table(doc, page_numbers=None, **extract_kwargs):
+        extracted.extend(page_numbers)
+        return extract_table(doc, page_numbers, **extract_kwargs)
+
+    monkeypatch.setattr(pdfstructure.source, "extract_table", counting_extract_table)
+    source = FileSource(sample("pictet_eltif.pdf"), **kwargs)
+    parse(source)
+    assert sorted(extracted) == source.page_numbers
+
+
+@pytest.mark.parametrize("name", SAMPLE_FILES[:2])
+def test_memory_sources_match_file(name):
+    with open(sample(name), "rb") as fp:
+        data = fp.read()
+    for source in (BytesSource(data), BytesSource(bytearray(data)), BytesSource(io.BytesIO(data)),
+                   BytesSource(data, lazy=True), MmapSource(sample(name)), MmapSource(sample(name), lazy=True)):
+        assert parsed(source) == reference(name)
+
+
+def test_mmap_source_unmaps_after_parse():
+    source = MmapSource(sample("ab_kid.pdf"), lazy=True)
+    parse(source)
+    assert source._map is None and source._doc is None
+
+
+def test_parallel_extraction_matches_single_process():
+    path = sample("pictet_eltif.pdf")
+    assert same_table(FileSource(path, workers=2).spans, FileSource(path).spans)
+
+
+@pytest.mark.parametrize("name", SAMPLE_FILES)
+def test_running_spans_are_not_streamed(name):
+    source = FileSource(sample(name))
+    running = running_mask(source.spans, source.running_keys)
+    assert running.any()
+    streamed = [element.span_index for element in source.read_blocks()]
+    assert streamed == np.flatnonzero(~running).tolist()
+    kept = FileSource(sample(name), drop_running=False)
+    assert [element.span_index for element in kept.read_blocks()] == list(range(len(kept.spans)))
+
+
+def test_running_page_numbers_detected():
+    source = FileSource(sample("ab_kid.pdf"))
+    running = running_mask(source.spans, source.running_keys)
+    texts = {source.spans.span_text(i) for i in np.flatnonzero(running)}
+    assert {"Page 1 of 3", "Page 2 of 3", "Page 3 of 3"} <= texts
+
+
+@pytest.mark.parametrize("name", SAMPLE_FILES)
+def test_page_sample_finds_the_running_keys(name):
+    assert FileSource(sample(name), lazy=True).running_keys == FileSource(sample(name)).running_keys
+
+
+def test_page_masks_match_document_mask():
+    source = FileSource(sample("pictet_eltif.pdf"))
+    running = running_mask(source.spans, source.running_keys)
+    for page in source.spans.pages:
+        start, stop = int(page['span_start']), int(page['span_stop'])
+        page_table = source.spans.page_table(int(page['number']))
+        assert np.array_equal(running_mask(page_table, source.running_keys), running[start:stop])